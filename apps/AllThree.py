@@ -1,9 +1,25 @@
 import streamlit as st
 import pandas as pd
-from typing import Dict, Tuple, Any, Optional, List
+import numpy as np
+from typing import Dict, Tuple, Any, Optional, Mapping
 import re
+import sys
 from datetime import datetime
 import io
+import os
+from pathlib import Path
+import pyarrow
+from rapidfuzz import fuzz, process, utils
+
+# Pages run as standalone scripts (directly or via main.py), so the shared module is imported
+# from this folder rather than as part of a package
+APPS_DIR = os.path.dirname(os.path.abspath(__file__))
+if APPS_DIR not in sys.path:
+    sys.path.insert(0, APPS_DIR)
+from _gedcom_core import (
+    PREVIEW_ROWS, CATEGORICAL_COLUMNS, gedcom_digest, parse_gedcom, format_gedcom_dates, resolve_names,
+    read_genealogy_csv,
+)
 
 # --- App Configuration ---
 st.set_page_config(layout="wide", page_title="Genealogy Workbench", page_icon="🌳")
@@ -12,132 +28,111 @@ st.set_page_config(layout="wide", page_title="Genealogy Workbench", page_icon="
 # SECTION 1: SHARED CORE FUNCTIONS v3.2
 # ==============================================================================
 
-@st.cache_data
-def parse_gedcom(file_contents: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
-    """Parses GEDCOM file contents and extracts individuals and families."""
-    individuals: Dict[str, Any] = {}
-    families: Dict[str, Any] = {}
-    current_id: Optional[str] = None
-    current_type: Optional[str] = None
-    records: Dict[str, Any] = {}
-    last_tag_info: Dict[str, Any] = {}
-    lines = file_contents.strip().splitlines()
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        
-        try:
-            parts = line.split(" ", 2)
-            level = int(parts[0])
-        except (ValueError, IndexError):
-            continue
-        
-        if level == 0:
-            if current_id and current_type:
-                if current_type == "INDI":
-                    individuals[current_id] = records
-                elif current_type == "FAM":
-                    families[current_id] = records
-            
-            if len(parts) > 2 and parts[2] in ("INDI", "FAM"):
-                current_id = parts[1].strip("@")
-                current_type = parts[2]
-                records = {}
-                last_tag_info = {}
-            else:
-                current_id = None
-                current_type = None
-        
-        if not current_id:
-            continue
-        
-        tag = parts[1].strip()
-        value = parts[2] if len(parts) > 2 else ""
-        
-        if level == 1:
-            if tag not in records:
-                records[tag] = []
-            records[tag].append(value)
-            last_tag_info = {"tag": tag, "index": len(records[tag]) - 1}
-        elif level > 1 and last_tag_info:
-            parent_tag = last_tag_info.get("tag")
-            p_idx = last_tag_info.get("index")
-            if p_idx is not None and parent_tag is not None:
-                if tag == "CONC":
-                    records[parent_tag][p_idx] += value
-                elif tag == "CONT":
-                    records[parent_tag][p_idx] += "\n" + value
-                else:
-                    full_tag = f"{parent_tag}_{tag}"
-                    if full_tag not in records:
-                        records[full_tag] = []
-                    records[full_tag].append(value)
-
-    if current_id and current_type:
-        if current_type == "INDI":
-            individuals[current_id] = records
-        elif current_type == "FAM":
-            families[current_id] = records
-    
-    return individuals, families
+# Punctuation dropped from names before matching ("J. Robert" -> "J Robert")
+NAME_PUNCTUATION_RE = re.compile(r'[.,]')
 
-@st.cache_data
-def generate_individual_dataset(_individuals: Dict[str, Any], _families: Dict[str, Any]) -> pd.DataFrame:
-    """Builds a clean dataset of individuals from parsed GEDCOM data."""
-    rows = []
-    _name_cache = {}
-    
-    def get_person_name(ind_id: Optional[str]) -> Optional[str]:
-        if not ind_id or pd.isna(ind_id):
-            return None
-        ind_id_clean = str(ind_id).strip('@')
-        if ind_id_clean in _name_cache:
-            return _name_cache[ind_id_clean]
-        name = (_individuals.get(ind_id_clean, {}).get("NAME", [None])[0] or "").replace("/", "")
-        _name_cache[ind_id_clean] = name
-        return name
+# American Soundex digit per consonant; vowels (and h/w/y) carry no digit
+SOUNDEX_DIGITS = {letter: str(digit)
+                  for digit, letters in enumerate(('bfpv', 'cgjkqsxz', 'dt', 'l', 'mn', 'r'), start=1)
+                  for letter in letters}
 
-    def format_gedcom_date(date_str: Any) -> Optional[str]:
-        if pd.isna(date_str):
-            return None
-        clean_date_str = re.sub(r'^(ABT|EST|CAL|INT|BEF|AFT|FROM|TO)\s+', '', str(date_str).strip(), flags=re.IGNORECASE)
-        clean_date_str = re.sub(r'^BET\s+(.*?)\s+AND.*', r'\1', clean_date_str, flags=re.IGNORECASE)
-        try:
-            return pd.to_datetime(clean_date_str, errors='coerce').strftime('%Y-%m-%d')
-        except:
-            return None
+# Columns added by prepare_for_matching that score_candidates reads
+MATCHING_COLUMNS = ('_name', '_norm_name', '_father', '_mother', '_birth_year', '_death_year')
+
+# Parsed GEDCOM datasets persisted across server restarts, one Feather file per upload digest
+GEDCOM_CACHE_DIR = Path.home() / ".streamlit_gedcom_cache"
+
+# Part of every cache file name; bump it whenever generate_individual_dataset's columns or
+# dtypes change, so files written by older code are never read back (and get pruned)
+GEDCOM_CACHE_VERSION = 1
+
+# Most datasets kept on disk; the least recently used beyond this are deleted
+GEDCOM_CACHE_MAX_FILES = 16
+
+@st.cache_resource(max_entries=4)
+def generate_individual_dataset(contents_hash: str, _individuals: Dict[str, Any], _families: Dict[str, Any]) -> pd.DataFrame:
+    """
+    Builds a clean dataset of individuals from parsed GEDCOM data.
+
+    The parsed dicts are excluded from the cache key (hashing them costs more than the build);
+    contents_hash, a digest of the uploaded file, identifies them instead. Every cache hit hands
+    back the same DataFrame without a pickle round-trip, so callers must treat it as read-only.
+    """
+    ids, genders, births, deaths, father_ids, mother_ids, fs_ids = [], [], [], [], [], [], []
+    name_map = {ind_id: (data.get("NAME") or "").replace("/", "") for ind_id, data in _individuals.items()}
 
     for ind_id, data in _individuals.items():
-        famc_id = (data.get("FAMC", [None])[0] or "").strip('@')
+        famc_id = data.get("FAMC")
         father_id, mother_id = None, None
         if famc_id:
             family_data = _families.get(famc_id, {})
-            father_id = (family_data.get("HUSB", [None])[0] or "").strip('@')
-            mother_id = (family_data.get("WIFE", [None])[0] or "").strip('@')
+            father_id = family_data.get("HUSB")
+            mother_id = family_data.get("WIFE")
         
-        rows.append({
-            "ID Number": ind_id,
-            "Full Name": get_person_name(ind_id),
-            "Gender": data.get("SEX", [None])[0],
-            "Birth Date": format_gedcom_date(data.get("BIRT_DATE", [None])[0]),
-            "Death Date": format_gedcom_date(data.get("DEAT_DATE", [None])[0]),
-            "Father's Full Name": get_person_name(father_id),
-            "Mother's Full Name": get_person_name(mother_id),
-            "FamilySearch ID": data.get("_FSFTID", [None])[0],
-        })
+        # Column-wise appends; the frame is built straight from these lists below
+        ids.append(ind_id)
+        genders.append(data.get("SEX"))
+        births.append(data.get("BIRT_DATE"))
+        deaths.append(data.get("DEAT_DATE"))
+        father_ids.append(father_id)
+        mother_ids.append(mother_id)
+        fs_ids.append(data.get("_FSFTID", [None])[0])
     
-    return pd.DataFrame(rows)
+    dataset = pd.DataFrame({
+        "ID Number": ids,
+        "Full Name": list(name_map.values()),
+        "Gender": genders,
+        "Birth Date": format_gedcom_dates(pd.Series(births, dtype=object)),
+        "Death Date": format_gedcom_dates(pd.Series(deaths, dtype=object)),
+        "Father's Full Name": resolve_names(father_ids, name_map),
+        "Mother's Full Name": resolve_names(mother_ids, name_map),
+        "FamilySearch ID": fs_ids,
+    }).astype(dict.fromkeys(CATEGORICAL_COLUMNS, "category"))
+    return dataset
+
+def prune_gedcom_cache(keep: Path) -> None:
+    """Deletes cached datasets from other GEDCOM_CACHE_VERSIONs and all but the newest GEDCOM_CACHE_MAX_FILES."""
+    current, stale = [], []
+    for path in GEDCOM_CACHE_DIR.glob("*.feather"):
+        (current if path.name.endswith(f".v{GEDCOM_CACHE_VERSION}.feather") else stale).append(path)
+    # Reads touch their file, so modification time orders the entries by last use
+    current.sort(key=lambda path: path.stat().st_mtime, reverse=True)
+    for path in stale + current[GEDCOM_CACHE_MAX_FILES:]:
+        if path != keep:
+            path.unlink(missing_ok=True)
+
+def load_or_build_dataset(file_bytes: bytes) -> Optional[pd.DataFrame]:
+    """
+    Returns the individual dataset for an uploaded GEDCOM, or None if it has no individuals.
 
-def get_year(date_str) -> Optional[int]:
-    """Extract year from date string."""
-    if pd.isna(date_str):
+    Datasets are also kept on disk as Feather files named by the file's digest and
+    GEDCOM_CACHE_VERSION, so re-uploading a file skips parsing entirely, even after a server
+    restart. The disk cache is best-effort: a file that can't be read or written is rebuilt.
+    """
+    contents_hash = gedcom_digest(file_bytes)
+    cache_path = GEDCOM_CACHE_DIR / f"{contents_hash}.v{GEDCOM_CACHE_VERSION}.feather"
+    if cache_path.exists():
+        try:
+            dataset = pd.read_feather(cache_path)
+            cache_path.touch()
+            return dataset
+        except (OSError, pyarrow.ArrowInvalid):
+            pass  # unreadable cache entry: rebuild it below
+
+    individuals, families = parse_gedcom(contents_hash, file_bytes)
+    if not individuals:
         return None
+    dataset = generate_individual_dataset(contents_hash, individuals, families)
     try:
-        return pd.to_datetime(date_str, errors='coerce').year
-    except:
-        return None
+        GEDCOM_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        # Write under a temporary name first so a concurrent reader never sees half a file
+        tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        dataset.to_feather(tmp_path)
+        os.replace(tmp_path, cache_path)
+        prune_gedcom_cache(keep=cache_path)
+    except OSError:
+        pass
+    return dataset
 
 def normalize_name(name: str) -> str:
     """Normalize names for better matching by handling initials and middle names."""
@@ -146,7 +141,7 @@ def normalize_name(name: str) -> str:
     
     name = str(name).lower().strip()
     # Remove punctuation
-    name = re.sub(r'[.,]', '', name)
+    name = NAME_PUNCTUATION_RE.sub('', name)
     # Split into parts
     parts = name.split()
     
@@ -166,6 +161,55 @@ def normalize_name(name: str) -> str:
     
     return normalized.strip()
 
+def soundex(word: str) -> str:
+    """American Soundex code of a word ("Smyth" -> "S530"); '' when it has no letters a-z."""
+    letters = [c for c in word.lower() if 'a' <= c <= 'z']
+    if not letters:
+        return ''
+    code = letters[0].upper()
+    previous = SOUNDEX_DIGITS.get(letters[0], '')
+    for letter in letters[1:]:
+        digit = SOUNDEX_DIGITS.get(letter, '')
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        # h and w do not separate two consonants with the same digit; vowels do
+        if letter not in 'hw':
+            previous = digit
+    return code.ljust(4, '0')
+
+def prepare_for_matching(df: pd.DataFrame) -> pd.DataFrame:
+    """Adds the lowercased/normalized name, gender and year columns the scorers read, computed once per dataset."""
+    def clean(column: str) -> pd.Series:
+        if column not in df:
+            return pd.Series('', index=df.index)
+        # Missing values become '' before the cast: astype(str) writes them as 'nan' on pandas 2.
+        # Via object, since fillna('') on a categorical column needs '' to be a category already
+        return df[column].astype(object).fillna('').astype(str).str.lower().str.strip()
+
+    def years(column: str) -> pd.Series:
+        if column not in df:
+            return pd.Series(np.nan, index=df.index, dtype=np.float32)
+        # One vectorized parse per column; the bulk scorers and calculate_match_score both read these
+        return pd.to_datetime(df[column], errors='coerce', format='mixed').dt.year.astype(np.float32)
+
+    names = clean('Full Name')
+    surnames = names.str.split().str[-1].fillna('')
+    return df.assign(
+        _name=names,
+        _norm_name=names.map(normalize_name),
+        _father=clean("Father's Full Name"),
+        _mother=clean("Mother's Full Name"),
+        _gender=clean('Gender').str.upper(),
+        # Blocking key: first letter of the surname ('' when there is no name)
+        _surname_initial=surnames.str[:1],
+        # Stricter blocking key: Soundex code of the surname, computed once per distinct surname
+        _surname_soundex=surnames.map({surname: soundex(surname) for surname in surnames.unique()}),
+        _birth_year=years('Birth Date'),
+        _death_year=years('Death Date'),
+    )
+
 def calculate_match_score(source_person, target_person, weights=None) -> Tuple[float, dict]:
     """
     Calculate a weighted match score between two individuals.
@@ -178,6 +222,8 @@ def calculate_match_score(source_person, target_person, weights=None) -> Tuple[f
     - Parent names match: 0-10 points
     
     Total possible: 100 points
+
+    Both people must come from a DataFrame passed through prepare_for_matching.
     """
     if weights is None:
         weights = {
@@ -187,23 +233,25 @@ def calculate_match_score(source_person, target_person, weights=None) -> Tuple[f
             'parents': 10
         }
     
-    from thefuzz import fuzz
     details = {}
     score = 0
     
     # 1. NAME MATCHING (0-40 points)
-    sp_name = str(source_person.get('Full Name', '')).lower().strip()
-    tp_name = str(target_person.get('Full Name', '')).lower().strip()
+    sp_name = source_person.get('_name', '')
+    tp_name = target_person.get('_name', '')
     
     if sp_name and tp_name:
         # Try multiple matching strategies
-        direct_score = fuzz.ratio(sp_name, tp_name)
-        token_sort_score = fuzz.token_sort_ratio(sp_name, tp_name)
+        # Scores are rounded to whole points, as thefuzz reported them. A later strategy only counts
+        # if it beats the best so far, so each one gets that as its score_cutoff and RapidFuzz can
+        # bail out early (returning 0) when it can't
+        direct_score = round(fuzz.ratio(sp_name, tp_name))
+        token_sort_score = round(fuzz.token_sort_ratio(sp_name, tp_name, processor=utils.default_process,
+                                                       score_cutoff=direct_score))
         
         # Normalized with initials
-        norm_sp = normalize_name(sp_name)
-        norm_tp = normalize_name(tp_name)
-        normalized_score = fuzz.ratio(norm_sp, norm_tp)
+        normalized_score = round(fuzz.ratio(source_person.get('_norm_name', ''), target_person.get('_norm_name', ''),
+                                            score_cutoff=max(direct_score, token_sort_score)))
         
         # Use best score
         best_name_score = max(direct_score, token_sort_score, normalized_score)
@@ -216,84 +264,75 @@ def calculate_match_score(source_person, target_person, weights=None) -> Tuple[f
         details['name_points'] = 0
     
     # 2. BIRTH DATE MATCHING (0-25 points)
-    sp_birth = source_person.get('Birth Date')
-    tp_birth = target_person.get('Birth Date')
+    sp_birth_year = source_person.get('_birth_year')
+    tp_birth_year = target_person.get('_birth_year')
     
-    if pd.notna(sp_birth) and pd.notna(tp_birth):
-        sp_birth_year = get_year(sp_birth)
-        tp_birth_year = get_year(tp_birth)
-        
-        if sp_birth_year and tp_birth_year:
-            year_diff = abs(sp_birth_year - tp_birth_year)
-            if year_diff == 0:
-                birth_points = weights['birth']  # Perfect match
-            elif year_diff == 1:
-                birth_points = weights['birth'] * 0.8  # 1 year off
-            elif year_diff == 2:
-                birth_points = weights['birth'] * 0.6  # 2 years off
-            elif year_diff <= 5:
-                birth_points = weights['birth'] * 0.3  # Close
-            else:
-                birth_points = 0
-            
-            score += birth_points
-            details['birth_diff'] = year_diff
-            details['birth_points'] = birth_points
+    if pd.notna(sp_birth_year) and pd.notna(tp_birth_year):
+        year_diff = int(abs(sp_birth_year - tp_birth_year))
+        if year_diff == 0:
+            birth_points = weights['birth']  # Perfect match
+        elif year_diff == 1:
+            birth_points = weights['birth'] * 0.8  # 1 year off
+        elif year_diff == 2:
+            birth_points = weights['birth'] * 0.6  # 2 years off
+        elif year_diff <= 5:
+            birth_points = weights['birth'] * 0.3  # Close
         else:
-            details['birth_diff'] = None
-            details['birth_points'] = 0
+            birth_points = 0
+        
+        score += birth_points
+        details['birth_diff'] = year_diff
+        details['birth_points'] = birth_points
     else:
         details['birth_diff'] = None
         details['birth_points'] = 0
     
     # 3. DEATH DATE MATCHING (0-25 points)
-    sp_death = source_person.get('Death Date')
-    tp_death = target_person.get('Death Date')
+    sp_death_year = source_person.get('_death_year')
+    tp_death_year = target_person.get('_death_year')
     
-    if pd.notna(sp_death) and pd.notna(tp_death):
-        sp_death_year = get_year(sp_death)
-        tp_death_year = get_year(tp_death)
-        
-        if sp_death_year and tp_death_year:
-            year_diff = abs(sp_death_year - tp_death_year)
-            if year_diff == 0:
-                death_points = weights['death']  # Perfect match
-            elif year_diff == 1:
-                death_points = weights['death'] * 0.8  # 1 year off
-            elif year_diff == 2:
-                death_points = weights['death'] * 0.6  # 2 years off
-            elif year_diff <= 5:
-                death_points = weights['death'] * 0.3  # Close
-            else:
-                death_points = 0
-            
-            score += death_points
-            details['death_diff'] = year_diff
-            details['death_points'] = death_points
+    if pd.notna(sp_death_year) and pd.notna(tp_death_year):
+        year_diff = int(abs(sp_death_year - tp_death_year))
+        if year_diff == 0:
+            death_points = weights['death']  # Perfect match
+        elif year_diff == 1:
+            death_points = weights['death'] * 0.8  # 1 year off
+        elif year_diff == 2:
+            death_points = weights['death'] * 0.6  # 2 years off
+        elif year_diff <= 5:
+            death_points = weights['death'] * 0.3  # Close
         else:
-            details['death_diff'] = None
-            details['death_points'] = 0
+            death_points = 0
+        
+        score += death_points
+        details['death_diff'] = year_diff
+        details['death_points'] = death_points
     else:
         details['death_diff'] = None
         details['death_points'] = 0
     
     # 4. PARENT NAME MATCHING (0-10 points)
+    # Scores below the cutoff come back as 0, letting RapidFuzz bail out early; it sits half a
+    # point lower so that scores rounding up to a whole 80 still count
+    parent_cutoff = 80
     parent_points = 0
     
     # Father
-    sp_father = str(source_person.get("Father's Full Name", '')).lower().strip()
-    tp_father = str(target_person.get("Father's Full Name", '')).lower().strip()
-    if sp_father and tp_father and sp_father != 'nan' and tp_father != 'nan':
-        father_score = fuzz.token_sort_ratio(sp_father, tp_father)
-        if father_score >= 80:
+    sp_father = source_person.get('_father', '')
+    tp_father = target_person.get('_father', '')
+    if sp_father and tp_father:
+        father_score = fuzz.token_sort_ratio(sp_father, tp_father, processor=utils.default_process,
+                                            score_cutoff=parent_cutoff - 0.5)
+        if round(father_score) >= parent_cutoff:
             parent_points += weights['parents'] * 0.5
     
     # Mother
-    sp_mother = str(source_person.get("Mother's Full Name", '')).lower().strip()
-    tp_mother = str(target_person.get("Mother's Full Name", '')).lower().strip()
-    if sp_mother and tp_mother and sp_mother != 'nan' and tp_mother != 'nan':
-        mother_score = fuzz.token_sort_ratio(sp_mother, tp_mother)
-        if mother_score >= 80:
+    sp_mother = source_person.get('_mother', '')
+    tp_mother = target_person.get('_mother', '')
+    if sp_mother and tp_mother:
+        mother_score = fuzz.token_sort_ratio(sp_mother, tp_mother, processor=utils.default_process,
+                                            score_cutoff=parent_cutoff - 0.5)
+        if round(mother_score) >= parent_cutoff:
             parent_points += weights['parents'] * 0.5
     
     score += parent_points
@@ -302,10 +341,90 @@ def calculate_match_score(source_person, target_person, weights=None) -> Tuple[f
     
     return score, details
 
+def score_candidates(source_df: Mapping[str, Any], target_df: Mapping[str, Any], weights=None) -> np.ndarray:
+    """
+    Vectorized calculate_match_score: returns the total score of every source x target pair
+    as a (len(source_df), len(target_df)) matrix.
+
+    Both frames must come from prepare_for_matching; a dict of their MATCHING_COLUMNS as NumPy
+    arrays works too, and saves building a DataFrame per block. The points are combined with the
+    same float operations, in the same order, as calculate_match_score, so the totals agree exactly.
+    """
+    if weights is None:
+        weights = {
+            'name': 40,
+            'birth': 25,
+            'death': 25,
+            'parents': 10
+        }
+
+    def present(values: np.ndarray, others: np.ndarray) -> np.ndarray:
+        return (values != '')[:, None] & (others != '')[None, :]
+
+    def add_year_points(score: np.ndarray, src_years: np.ndarray, tgt_years: np.ndarray, weight: float) -> None:
+        # Years as int16, with missing ones mapped to sentinels at opposite ends so that any pair
+        # involving one is thousands of years apart and falls past every tier
+        src = np.nan_to_num(src_years, nan=-10000).astype(np.int16)
+        tgt = np.nan_to_num(tgt_years, nan=10000).astype(np.int16)
+        # Points indexed by year difference: exact, 1 year, 2 years, up to 5 years, further
+        tiers = np.array([weight, weight * 0.8, weight * 0.6, weight * 0.3, weight * 0.3, weight * 0.3, 0.0])
+        year_diff = np.subtract(src[:, None], tgt[None, :])
+        np.abs(year_diff, out=year_diff)
+        np.minimum(year_diff, 6, out=year_diff)
+        score += tiers[year_diff]
+
+    # Each step below updates the one score matrix in place rather than allocating a new
+    # float64 temporary per operation
+
+    # 1. NAME MATCHING: best of the three strategies, each one cdist call folded into the
+    # running maximum as soon as it is ready
+    src_names = np.asarray(source_df['_name'])
+    tgt_names = np.asarray(target_df['_name'])
+    score = process.cdist(src_names, tgt_names, scorer=fuzz.ratio, dtype=np.float64, workers=-1)
+    np.maximum(score,
+               process.cdist(src_names, tgt_names, scorer=fuzz.token_sort_ratio,
+                             processor=utils.default_process, dtype=np.float64, workers=-1),
+               out=score)
+    np.maximum(score,
+               process.cdist(np.asarray(source_df['_norm_name']), np.asarray(target_df['_norm_name']),
+                             scorer=fuzz.ratio, dtype=np.float64, workers=-1),
+               out=score)
+    # Whole points, as calculate_match_score rounds them (np.rint and round() both round half to even)
+    np.rint(score, out=score)
+    score /= 100
+    score *= weights['name']
+    score[~present(src_names, tgt_names)] = 0.0
+
+    # 2./3. BIRTH AND DEATH YEARS
+    add_year_points(score, np.asarray(source_df['_birth_year']), np.asarray(target_df['_birth_year']), weights['birth'])
+    add_year_points(score, np.asarray(source_df['_death_year']), np.asarray(target_df['_death_year']), weights['death'])
+
+    # 4. PARENT NAMES: count the matching parents, then add their points in one step. The
+    # cutoff sits half a point lower and the uint8 scores come back rounded, so a score
+    # counts exactly when it rounds to a whole parent_cutoff, as in calculate_match_score
+    parent_cutoff = 80
+    parents_matched = np.zeros(score.shape, dtype=np.uint8)
+    for column in ('_father', '_mother'):
+        src_parents = np.asarray(source_df[column])
+        tgt_parents = np.asarray(target_df[column])
+        parent_score = process.cdist(src_parents, tgt_parents, scorer=fuzz.token_sort_ratio,
+                                     processor=utils.default_process, score_cutoff=parent_cutoff - 0.5,
+                                     dtype=np.uint8, workers=-1)
+        parents_matched += present(src_parents, tgt_parents) & (parent_score >= parent_cutoff)
+    score += parents_matched * (weights['parents'] * 0.5)
+
+    return score
+
 # ==============================================================================
 # SECTION 2: REUSABLE UI AND MAIN LAYOUT
 # ==============================================================================
 
+def show_preview(df: pd.DataFrame, height: int) -> None:
+    """Shows the first PREVIEW_ROWS rows of a table, noting when more were left out."""
+    st.dataframe(df.head(PREVIEW_ROWS), use_container_width=True, height=height)
+    if len(df) > PREVIEW_ROWS:
+        st.caption(f"Showing the first {PREVIEW_ROWS:,} of {len(df):,} rows")
+
 def create_processor_ui(title: str, upload_label: str, button_label: str, 
                        session_df_key: str, session_name_key: str, uploader_key: str):
     """Creates a UI for processing either a GEDCOM or a CSV file."""
@@ -317,19 +436,12 @@ def create_processor_ui(title: str, upload_label: str, button_label: str,
             
             if uploaded_file.name.lower().endswith('.csv'):
                 with st.spinner("Loading CSV..."):
-                    dataset = pd.read_csv(uploaded_file)
+                    dataset = read_genealogy_csv(uploaded_file)
                 st.info(f"📊 Loaded {len(dataset)} rows from CSV: **{uploaded_file.name}**")
             else:
                 with st.spinner("Parsing GEDCOM..."):
-                    try:
-                        contents = uploaded_file.read().decode("utf-8-sig")
-                    except UnicodeDecodeError:
-                        uploaded_file.seek(0)
-                        contents = uploaded_file.read().decode("latin-1")
-                    
-                    individuals, families = parse_gedcom(contents)
-                    if individuals:
-                        dataset = generate_individual_dataset(individuals, families)
+                    dataset = load_or_build_dataset(uploaded_file.getvalue())
+                    if dataset is not None:
                         st.info(f"👥 Parsed {len(dataset)} individuals from GEDCOM: **{uploaded_file.name}**")
                     else:
                         st.warning("⚠️ No individuals found in this GEDCOM file.")
@@ -350,7 +462,7 @@ def create_processor_ui(title: str, upload_label: str, button_label: str,
                     st.caption(f"📅 Birth dates: {birth_count} | Death dates: {death_count}")
                 
                 with st.container():
-                    st.dataframe(dataset, use_container_width=True, height=250)
+                    show_preview(dataset, height=250)
 
 # --- Initialize session state ---
 if 'comparison_results' not in st.session_state:
@@ -412,6 +524,10 @@ with st.expander("🔍 STEP 3: Compare Source and Target", expanded=True):
         with col1:
             match_threshold = st.slider("Match Threshold Score", 50, 95, 90, 
                                       help="Minimum total score (out of 100) to consider a match. Lower = more lenient.")
+            block_by_surname = st.checkbox("Only compare people whose surnames share a first letter", value=False,
+                                           help="Much faster on large trees, but misses matches recorded under a different surname (e.g. married names).")
+            block_by_soundex = st.checkbox("...and whose surnames sound alike (Soundex)", value=False, disabled=not block_by_surname,
+                                           help="Faster still: Smith/Smyth are compared, Smith/Snider are not. Misses misspellings that change the sound.")
         with col2:
             st.info("""
             **Scoring System:**
@@ -422,8 +538,8 @@ with st.expander("🔍 STEP 3: Compare Source and Target", expanded=True):
             """)
 
         if st.button("🚀 Run Comparison", use_container_width=True, type="primary"):
-            source_df = st.session_state.source_df.copy()
-            target_df = st.session_state.target_df.copy()
+            source_df = prepare_for_matching(st.session_state.source_df)
+            target_df = prepare_for_matching(st.session_state.target_df)
             
             total_comparisons = len(source_df) * len(target_df)
             st.info(f"Processing {len(source_df)} source records against {len(target_df)} target records...")
@@ -431,103 +547,128 @@ with st.expander("🔍 STEP 3: Compare Source and Target", expanded=True):
             progress_bar = st.progress(0)
             status_text = st.empty()
 
-            # PRE-PROCESSING: Index target by birth year for fast lookup
-            target_by_year = {}
-            for tidx, tperson in target_df.iterrows():
-                birth_year = get_year(tperson.get('Birth Date'))
-                if birth_year:
-                    if birth_year not in target_by_year:
-                        target_by_year[birth_year] = []
-                    target_by_year[birth_year].append(tidx)
+            # PRE-PROCESSING: Sort target by birth year so every ±5-year window is one contiguous slice
+            target_years = target_df['_birth_year'].to_numpy()
+            has_birth = ~np.isnan(target_years)
+            target_by_year = np.flatnonzero(has_birth)
+            target_by_year = target_by_year[np.argsort(target_years[target_by_year], kind='stable')]
+            sorted_years = target_years[target_by_year]
             
             # Also keep track of records without birth dates
-            target_no_birth = []
-            for tidx, tperson in target_df.iterrows():
-                if not get_year(tperson.get('Birth Date')):
-                    target_no_birth.append(tidx)
+            target_no_birth = np.flatnonzero(~has_birth)
+            all_targets = np.arange(len(target_df))
+            target_genders = target_df['_gender'].to_numpy()
+            source_genders = source_df['_gender'].to_numpy()
+            # Blocks are scored from plain column arrays; slicing those is far cheaper than df.iloc
+            source_columns = {column: source_df[column].to_numpy() for column in MATCHING_COLUMNS}
+            target_columns = {column: target_df[column].to_numpy() for column in MATCHING_COLUMNS}
 
-            missing_indices = []
-            match_details = []
+            best_scores = np.zeros(len(source_df))
+            best_matches = np.full(len(source_df), -1)
             
             comparisons_made = 0
-            comparisons_skipped = 0
-
-            # Process each source person
-            for idx, source_person in source_df.iterrows():
-                # Update progress
-                progress = idx / len(source_df)
-                progress_bar.progress(progress)
-                status_text.text(f"Processing {idx + 1} of {len(source_df)}: {source_person['Full Name']}")
-                
-                best_score = 0
-                best_match_idx = None
-                best_details = None
+
+            # A Soundex code starts with the surname initial, so it only ever narrows that block
+            surname_key = '_surname_soundex' if block_by_soundex else '_surname_initial'
+            target_surname_keys = target_df[surname_key].to_numpy()
+            block_keys = ['_birth_year', surname_key] if block_by_surname else '_birth_year'
+            
+            # Sources sharing a birth year (and surname key) share one candidate list, so each is scored as one block
+            blocks = source_df.groupby(block_keys, dropna=False, sort=False).indices
+            rows_done = 0
+            # Each widget update is a message to the browser, so refresh them about once per percent
+            progress_step = max(1, len(source_df) // 100)
+            next_progress_update = 0
+            for block_key, block_rows in blocks.items():
+                birth_year, surname_code = block_key if block_by_surname else (block_key, '')
+                if rows_done >= next_progress_update:
+                    progress_bar.progress(rows_done / len(source_df))
+                    status_text.text(f"Processing {rows_done + 1}-{rows_done + len(block_rows)} of {len(source_df)}")
+                    next_progress_update = rows_done + progress_step
+                rows_done += len(block_rows)
                 
                 # SMART FILTERING: Only compare against candidates with similar birth years
-                sp_birth_year = get_year(source_person.get('Birth Date'))
-                candidate_indices = []
-                
-                if sp_birth_year:
+                if pd.notna(birth_year):
                     # Look for matches within ±5 years
                     year_range = 5
-                    for year in range(sp_birth_year - year_range, sp_birth_year + year_range + 1):
-                        if year in target_by_year:
-                            candidate_indices.extend(target_by_year[year])
+                    lo = np.searchsorted(sorted_years, birth_year - year_range, side='left')
+                    hi = np.searchsorted(sorted_years, birth_year + year_range, side='right')
                     # Also check records without birth dates
-                    candidate_indices.extend(target_no_birth)
+                    candidate_indices = np.concatenate([target_by_year[lo:hi], target_no_birth])
                 else:
                     # No birth year in source - must check all targets
-                    candidate_indices = list(range(len(target_df)))
-                
-                comparisons_skipped += len(target_df) - len(candidate_indices)
-                
-                # Compare only against filtered candidates
-                sp_gender = str(source_person.get('Gender', '')).strip().upper()
+                    candidate_indices = all_targets
+                if surname_code:
+                    # Same surname key only; targets without a name stay candidates
+                    candidate_keys = target_surname_keys[candidate_indices]
+                    candidate_indices = candidate_indices[(candidate_keys == surname_code) | (candidate_keys == '')]
+                if len(candidate_indices) == 0:
+                    continue
                 
-                for tidx in candidate_indices:
-                    target_person = target_df.iloc[tidx]
+                # Bound each score matrix to a few million cells
+                chunk_size = max(1, 2_000_000 // len(candidate_indices))
+                for start in range(0, len(block_rows), chunk_size):
+                    rows = block_rows[start:start + chunk_size]
+                    scores = score_candidates({column: values[rows] for column, values in source_columns.items()},
+                                              {column: values[candidate_indices] for column, values in target_columns.items()})
                     
                     # GENDER FILTER: Skip if genders don't match (when both are known)
-                    tp_gender = str(target_person.get('Gender', '')).strip().upper()
-                    if sp_gender and tp_gender and sp_gender != tp_gender:
-                        comparisons_skipped += 1
-                        continue
-                    
-                    score, details = calculate_match_score(source_person, target_person)
-                    comparisons_made += 1
-                    
-                    if score > best_score:
-                        best_score = score
-                        best_match_idx = tidx
-                        best_details = details
+                    sg = source_genders[rows]
+                    tg = target_genders[candidate_indices]
+                    gender_ok = ~(
+                        (sg != '')[:, None] & (tg != '')[None, :] &
+                        (sg[:, None] != tg[None, :])
+                    )
+                    scores[~gender_ok] = -1
+                    comparisons_made += int(gender_ok.sum())
                     
-                    # Early exit if perfect match found
-                    if score >= 95:
-                        break
+                    # argmax keeps the first best candidate, as the old strict '>' scan did
+                    best_cols = scores.argmax(axis=1)
+                    row_best = scores[np.arange(len(rows)), best_cols]
+                    found = row_best > 0
+                    best_scores[rows[found]] = row_best[found]
+                    best_matches[rows[found]] = candidate_indices[best_cols[found]]
+            
+            comparisons_skipped = total_comparisons - comparisons_made
+            missing_indices = []
+            match_details = []
+            
+            # Determine which source people are missing and describe their best candidate; both sides
+            # come out of the frames as plain dicts in one bulk slice each instead of an .iloc per row
+            missing_positions = np.flatnonzero(best_scores < match_threshold)
+            missing_people = source_df.iloc[missing_positions].to_dict('records')
+            candidate_positions = best_matches[missing_positions]
+            candidate_rows = iter(target_df.iloc[candidate_positions[candidate_positions >= 0]].to_dict('records'))
+            for idx, source_person, best_score, best_match_idx in zip(
+                    source_df.index[missing_positions], missing_people, best_scores[missing_positions], candidate_positions):
+                best_match = next(candidate_rows) if best_match_idx >= 0 else None
+                best_details = None
+                if best_match is not None:
+                    _, best_details = calculate_match_score(source_person, best_match)
+                missing_indices.append(idx)
                 
-                # Determine if this is a match
-                if best_score < match_threshold:
-                    missing_indices.append(idx)
-                    
-                    match_info = {
-                        'index': idx,
-                        'name': source_person['Full Name'],
-                        'birth': source_person.get('Birth Date'),
-                        'death': source_person.get('Death Date'),
-                        'best_match': target_df.iloc[best_match_idx]['Full Name'] if best_match_idx is not None else None,
-                        'match_birth': target_df.iloc[best_match_idx].get('Birth Date') if best_match_idx is not None else None,
-                        'match_death': target_df.iloc[best_match_idx].get('Death Date') if best_match_idx is not None else None,
-                        'score': round(best_score, 1),
-                        'name_similarity': round(best_details.get('name_score', 0), 1) if best_details else 0,
-                        'birth_diff': best_details.get('birth_diff') if best_details else None,
-                        'death_diff': best_details.get('death_diff') if best_details else None,
-                        'reason': 'No strong match found'
-                    }
-                    match_details.append(match_info)
+                match_info = {
+                    'index': idx,
+                    'name': source_person['Full Name'],
+                    'birth': source_person.get('Birth Date'),
+                    'death': source_person.get('Death Date'),
+                    'best_match': best_match['Full Name'] if best_match is not None else None,
+                    'match_birth': best_match.get('Birth Date') if best_match is not None else None,
+                    'match_death': best_match.get('Death Date') if best_match is not None else None,
+                    'score': round(best_score, 1),
+                    'name_similarity': round(best_details.get('name_score', 0), 1) if best_details else 0,
+                    'birth_diff': best_details.get('birth_diff') if best_details else None,
+                    'death_diff': best_details.get('death_diff') if best_details else None,
+                    'reason': 'No strong match found'
+                }
+                match_details.append(match_info)
             
-            progress_bar.progress(1.0)
+            # Clear the progress indicators right away; the summary goes to a toast, which fades on
+            # its own in the browser instead of holding up the script
+            progress_bar.empty()
+            status_text.empty()
             efficiency = (comparisons_skipped / total_comparisons * 100) if total_comparisons > 0 else 0
-            status_text.text(f"✅ Complete! Made {comparisons_made:,} comparisons (skipped {comparisons_skipped:,} - {efficiency:.1f}% reduction)")
+            st.toast(f"✅ Complete! Made {comparisons_made:,} comparisons (skipped {comparisons_skipped:,} - {efficiency:.1f}% reduction)")
             
             # Store results
             st.session_state.comparison_results = {
@@ -537,12 +678,6 @@ with st.expander("🔍 STEP 3: Compare Source and Target", expanded=True):
             }
 
             st.success(f"✅ Found **{len(missing_indices)}** likely missing individuals out of {len(source_df)} source records.")
-            
-            # Clear progress indicators after a moment
-            import time
-            time.sleep(2)
-            progress_bar.empty()
-            status_text.empty()
 
         # Display results
         if st.session_state.comparison_results:
@@ -550,8 +685,6 @@ with st.expander("🔍 STEP 3: Compare Source and Target", expanded=True):
             missing_indices = results['missing_indices']
             
             if missing_indices:
-                missing_df = results['source_df'].loc[missing_indices].copy()
-                
                 # Add match details
                 if results['match_details']:
                     match_info = pd.DataFrame(results['match_details'])
@@ -560,13 +693,14 @@ with st.expander("🔍 STEP 3: Compare Source and Target", expanded=True):
                     display_cols = ['name', 'birth', 'death', 'score', 'name_similarity', 
                                    'best_match', 'match_birth', 'match_death', 'birth_diff', 'death_diff']
                     
-                    match_display = match_info[display_cols].copy()
-                    match_display.columns = ['Source Name', 'Source Birth', 'Source Death', 
-                                            'Match Score', 'Name %', 'Best Match Name', 
-                                            'Match Birth', 'Match Death', 'Birth Δ Years', 'Death Δ Years']
+                    # Selecting the columns already yields a new frame; relabel it without another copy
+                    match_display = match_info[display_cols].set_axis(
+                        ['Source Name', 'Source Birth', 'Source Death', 
+                         'Match Score', 'Name %', 'Best Match Name', 
+                         'Match Birth', 'Match Death', 'Birth Δ Years', 'Death Δ Years'], axis=1)
                     
                     st.subheader("Missing Individuals with Best Matches")
-                    st.dataframe(match_display, use_container_width=True, height=400)
+                    show_preview(match_display, height=400)
                     
                     # Show score distribution
                     st.subheader("Score Analysis")
@@ -584,7 +718,7 @@ with st.expander("🔍 STEP 3: Compare Source and Target", expanded=True):
                 col1, col2 = st.columns(2)
                 with col1:
                     # Export for further review
-                    export_df = match_display.copy()
+                    export_df = match_display
                     csv = export_df.to_csv(index=False).encode('utf-8')
                     st.download_button(
                         "⬇️ Download Missing Persons CSV",
@@ -597,7 +731,7 @@ with st.expander("🔍 STEP 3: Compare Source and Target", expanded=True):
                 with col2:
                     # Excel download option
                     buffer = io.BytesIO()
-                    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+                    with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
                         export_df.to_excel(writer, index=False, sheet_name='Missing Persons')
                     
                     st.download_button(
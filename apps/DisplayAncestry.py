@@ -1,156 +1,120 @@
 # v1.0
-import pandas as pd
+import os
+import sys
 import streamlit as st
-from io import BytesIO
+from collections import Counter
 from st_aggrid import AgGrid, GridOptionsBuilder
-from graphviz import Digraph
+from graphviz import Source
+
+# Pages run as standalone scripts (directly or via main.py), so the shared module is imported
+# from this folder rather than as part of a package
+APPS_DIR = os.path.dirname(os.path.abspath(__file__))
+if APPS_DIR not in sys.path:
+    sys.path.insert(0, APPS_DIR)
+from _gedcom_core import EXPORT_FORMATS, parse_individual_tags, build_individual_table, convert_df
 
 # Set the page layout to wide
 st.set_page_config(layout="wide", page_title="Gedcoms")
 
-def parse_gedcom(file_contents):
-    individuals = {}
-    current_individual = None
-    current_individual_data = {}
-    current_tag = None
-
-    for line in file_contents.splitlines():
-        line = line.strip()
-        if line.startswith('0 @I'):
-            if current_individual is not None:
-                individuals[current_individual] = current_individual_data
-                current_individual_data = {}
-            current_individual = line.split('@')[1]
-        elif line.startswith('1'):
-            parts = line.split(' ')
-            current_tag = parts[1]
-            value = parts[2:]
-            current_individual_data.setdefault(current_tag, []).append(' '.join(value))
-        elif line.startswith('2'):
-            parts = line.split(' ')
-            add_tag = parts[1]
-            value = parts[2:]
-            full_tag = current_tag + add_tag
-            current_individual_data.setdefault(full_tag, []).append(' '.join(value))
-        else:
-            continue
-
-    if current_individual is not None:
-        individuals[current_individual] = current_individual_data
-
-    return individuals
-
-@st.cache_data
-def convert_df(df):
-    excel_buffer = BytesIO()
-    df.to_excel(excel_buffer, index=False)
-    excel_buffer.seek(0)
-    return excel_buffer
+# AgGrid serializes every row to JSON for its JS grid; bigger tables go to st.dataframe (Arrow) instead
+AGGRID_MAX_ROWS = 2000
 
-def visualize_family_tree(individuals):
-    dot = Digraph()
+def dot_quote(text):
+    # A double-quoted DOT ID, with backslashes and quotes escaped
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
 
-    # Add nodes for individuals
+def visualize_family_tree(individuals):
+    # The DOT source is written out directly; Digraph.node()/edge() would run their quoting
+    # and attribute formatting separately for every one of tens of thousands of statements.
+    # strict merges repeated person -> family links into one edge.
+    lines = ['strict digraph {', '\tedge [label=Parent]']
+
+    # Families are never added as nodes, so graphviz creates one implicitly per edge target.
+    # Only draw edges to families that link more than one person; the rest are dead-end ghosts.
+    # One pass adds the individuals' nodes and counts each family's members.
+    family_members = Counter()
     for individual_id, individual in individuals.items():
-        name = ' '.join(individual.get('NAME', ['Unknown']))
-        dot.node(individual_id, name)
+        name = b' '.join(individual.get('NAME', [b'Unknown'])).decode('utf-8', 'replace')
+        lines.append(f'\t{dot_quote(individual_id)} [label={dot_quote(name)}]')
+        family_members.update(individual.get('FAMS', []))
+        family_members.update(individual.get('FAMC', []))
+    linked_families = {fam for fam, count in family_members.items() if count > 1}
 
     # Add edges for relationships
-    for individual_id, individual in individuals.items():
-        for fam in individual.get('FAMS', []):
-            dot.edge(individual_id, fam, label="Parent")
-
-    return dot
+    lines.extend(
+        f'\t{dot_quote(individual_id)} -> {dot_quote(fam.decode("utf-8", "replace"))}'
+        for individual_id, individual in individuals.items()
+        for fam in individual.get('FAMS', [])
+        if fam in linked_families
+    )
+    lines.append('}')
+    return '\n'.join(lines)
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_gedcom(file_bytes):
+    # Everything derived from the file alone is cached on its bytes, so reruns from the
+    # search box or the birth-year slider reuse it instead of parsing again
+    individuals = parse_individual_tags(file_bytes)
+    individual_df = build_individual_table(individuals)
+
+    # Lowercased once here, so each search keystroke is a plain substring scan
+    search_names = individual_df['NAME'].str.lower()
+    return individual_df, search_names, visualize_family_tree(individuals)
 
 def main():
     st.title("Gedcom from Ancestry v1.0")
     st.sidebar.write("Upload a Gedcom file to parse its contents")
 
     uploaded_file = st.sidebar.file_uploader("Choose a Gedcom file", type="ged")
+    export_format = st.sidebar.radio("Export format", list(EXPORT_FORMATS), horizontal=True)
 
     if uploaded_file is not None:
         try:
-            file_contents = uploaded_file.read().decode('utf-8')
-
+            # Remember the submission, so the search box and slider below keep the results on screen
             if st.sidebar.button("Submit"):
-                individuals = parse_gedcom(file_contents)
-                individual_data = []
-                max_fams_count = 0
-
-                # First pass to find the max number of FAMS entries
-                for individual in individuals.values():
-                    fams_count = len(individual.get('FAMS', []))
-                    if fams_count > max_fams_count:
-                        max_fams_count = fams_count
-
-                for individual_id, individual in individuals.items():
-                    data = {'ID': individual_id}
-                    for tag, values in individual.items():
-                        if tag == 'FAMS':
-                            for i, fam in enumerate(values):
-                                data[f'FAMS_{i+1}'] = fam
-                        else:
-                            data[tag] = ' '.join(values)
-                    individual_data.append(data)
-
-                individual_df = pd.DataFrame(individual_data)
-
-                # Build the list of expected columns
-                fams_columns = [f'FAMS_{i+1}' for i in range(max_fams_count)]
-                columns_to_keep = ['ID', 'NAME', '_FSFTID', 'SEX', 'BIRTDATE', 'BIRTDATEPLAC', 'FAMC', 'DEAT',
-                                   'DEATDATE', 'DEATDATEPLAC', 'BAPLDATE', 'BAPLDATETEMP', 'CONLDATE', 'CONLDATETEMP',
-                                   'ENDLDATE', 'ENDLDATETEMP', 'BURIDATE', 'BURIDATEPLAC', 'BURIPLAC'] + fams_columns
-
-                individual_df = individual_df.reindex(columns=columns_to_keep)
-
-                # Extract birth and death years
-                individual_df.insert(3, 'BIRTHYEAR', individual_df['BIRTDATE'].str.extract(r'(\d{4})$'))
-                individual_df.insert(10, 'DEATHYEAR', individual_df['DEATDATE'].str.extract(r'(\d{4})$'))
-                individual_df['BIRTHYEAR'] = pd.to_numeric(individual_df['BIRTHYEAR'], errors='coerce')
-                individual_df['DEATHYEAR'] = pd.to_numeric(individual_df['DEATHYEAR'], errors='coerce')
-
-                # Compute AGE
-                mask = individual_df['DEATHYEAR'].notnull() & individual_df['BIRTHYEAR'].notnull()
-                individual_df.loc[mask, 'AGE'] = individual_df.loc[mask, 'DEATHYEAR'] - individual_df.loc[mask, 'BIRTHYEAR']
-
-                # Count CHILDREN using FAMC appearances
-                famc_counts = individual_df['FAMC'].value_counts()
-                individual_df['CHILDREN'] = individual_df[fams_columns].apply(
-                    lambda row: sum(famc_counts.get(fam, 0) for fam in row if pd.notna(fam)),
-                    axis=1
-                )
+                st.session_state.ancestry_submitted = True
+
+            if st.session_state.get('ancestry_submitted'):
+                individual_df, search_names, tree_source = load_gedcom(uploaded_file.getvalue())
 
                 # Save in session state
                 st.session_state.individual_df = individual_df
 
                 # Display grid
                 st.write("Parsed Individuals:")
-                gb = GridOptionsBuilder.from_dataframe(individual_df)
-                gb.configure_pagination(paginationAutoPageSize=True)
-                gb.configure_side_bar()
-                gb.configure_default_column(editable=True, groupable=True, sortable=True, filterable=True)
-                gridOptions = gb.build()
+                if len(individual_df) <= AGGRID_MAX_ROWS:
+                    gb = GridOptionsBuilder.from_dataframe(individual_df)
+                    gb.configure_pagination(paginationAutoPageSize=True)
+                    gb.configure_side_bar()
+                    gb.configure_default_column(editable=True, groupable=True, sortable=True, filterable=True)
+                    gridOptions = gb.build()
 
-                AgGrid(individual_df, gridOptions=gridOptions)
+                    AgGrid(individual_df, gridOptions=gridOptions)
+                else:
+                    st.dataframe(individual_df, use_container_width=True)
 
                 # Download button
+                extension, mime = EXPORT_FORMATS[export_format]
                 st.download_button(
-                    label="Export to Excel",
-                    data=convert_df(individual_df),
-                    file_name="individuals.xlsx",
-                    mime="application/vnd.ms-excel",
+                    label=f"Export to {export_format}",
+                    data=convert_df(individual_df, export_format),
+                    file_name=f"individuals.{extension}",
+                    mime=mime,
                 )
 
                 # Family Tree Visualization
                 st.subheader("Family Tree Visualization")
-                dot = visualize_family_tree(individuals)
-                st.graphviz_chart(dot)
+                # The whole DOT source goes to the browser on every rerun, so large trees only
+                # render on request
+                if st.checkbox("Show family tree (slow for large files)", value=len(individual_df) <= AGGRID_MAX_ROWS):
+                    # sfdp lays out large pedigrees in near-linear time; dot's layered layout does not scale
+                    st.graphviz_chart(Source(tree_source, engine='sfdp'))
 
                 # Search Functionality
                 st.subheader("Search Individuals")
                 search_query = st.text_input("Search for an individual by name or ID:")
                 if search_query:
-                    filtered_df = individual_df[individual_df['NAME'].str.contains(search_query, na=False)]
+                    filtered_df = individual_df[search_names.str.contains(search_query.lower(), regex=False, na=False)]
                     st.write(filtered_df)
 
                 # Filter by Birth Year
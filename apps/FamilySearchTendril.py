@@ -1,155 +1,77 @@
 import streamlit as st
 import pandas as pd
-from typing import Dict, List, Tuple, Any, Optional
-import re
+from typing import Dict, List, Tuple, Any
+import os
+import sys
+from collections import deque
+
+# Pages run as standalone scripts (directly or via main.py), so the shared module is imported
+# from this folder rather than as part of a package
+APPS_DIR = os.path.dirname(os.path.abspath(__file__))
+if APPS_DIR not in sys.path:
+    sys.path.insert(0, APPS_DIR)
+from _gedcom_core import (
+    PREVIEW_ROWS, CATEGORICAL_COLUMNS, gedcom_digest, parse_gedcom, format_gedcom_dates, resolve_names,
+)
 
 # Set the page layout to wide
 st.set_page_config(layout="wide", page_title="GEDCOM Individual Dataset Generator v2.7")
 
 # ---------------------------------------------------------
-# GEDCOM PARSER (UNCHANGED)
+# DATASET GENERATOR
 # ---------------------------------------------------------
 
-def parse_gedcom(file_contents: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
-    """
-    Parses GEDCOM file contents and extracts individuals and families.
-    """
-    individuals: Dict[str, Any] = {}
-    families: Dict[str, Any] = {}
-    current_id: Optional[str] = None
-    current_type: Optional[str] = None
-    records: Dict[str, Any] = {}
-    last_tag_info: Dict[str, Any] = {}
-    lines = file_contents.strip().splitlines()
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        
-        try:
-            parts = line.split(" ", 2)
-            level = int(parts[0])
-        except (ValueError, IndexError):
-            continue
-
-        if level == 0:
-            if current_id and current_type:
-                if current_type == "INDI":
-                    individuals[current_id] = records
-                elif current_type == "FAM":
-                    families[current_id] = records
-            if len(parts) > 2 and parts[2] in ("INDI", "FAM"):
-                current_id = parts[1].strip("@")
-                current_type = parts[2]
-                records = {}
-                last_tag_info = {}
-            else:
-                current_id = None
-                current_type = None
-        
-        if not current_id:
-            continue
-            
-        tag = parts[1].strip()
-        value = parts[2] if len(parts) > 2 else ""
-        if level == 1:
-            if tag not in records:
-                records[tag] = []
-            records[tag].append(value)
-            last_tag_info = {"tag": tag, "index": len(records[tag]) - 1}
-        elif level > 1 and last_tag_info:
-            parent_tag = last_tag_info.get("tag")
-            parent_index = last_tag_info.get("index")
-            
-            if parent_tag and parent_index is not None:
-                if tag == "CONC":
-                    records[parent_tag][parent_index] += value
-                elif tag == "CONT":
-                    records[parent_tag][parent_index] += "\n" + value
-                else:
-                    full_tag = f"{parent_tag}_{tag}"
-                    if full_tag not in records:
-                        records[full_tag] = []
-                    records[full_tag].append(value)
-
-    if current_id and current_type:
-        if current_type == "INDI":
-            individuals[current_id] = records
-        elif current_type == "FAM":
-            families[current_id] = records
-            
-    return individuals, families
-
-# ---------------------------------------------------------
-# HELPER FUNCTION FOR DATE FORMATTING (UNCHANGED)
-# ---------------------------------------------------------
-
-def format_gedcom_date(date_str: Optional[str]) -> Optional[str]:
-    """
-    Parses various GEDCOM date formats into a single 'YYYY-MM-DD' format.
-    """
-    if not date_str or pd.isna(date_str):
-        return None
-    clean_date_str = re.sub(r'^(ABT|EST|CAL|INT|BEF|AFT|FROM|TO)\s+', '', str(date_str).strip(), flags=re.IGNORECASE)
-    clean_date_str = re.sub(r'^BET\s+(.*?)\s+AND.*', r'\1', clean_date_str, flags=re.IGNORECASE)
-    try:
-        dt_object = pd.to_datetime(clean_date_str, errors='coerce')
-        return dt_object.strftime('%Y-%m-%d') if pd.notna(dt_object) else None
-    except:
-        return None
-
-# ---------------------------------------------------------
-# DATASET GENERATOR (UPDATED)
-# ---------------------------------------------------------
-
-def generate_individual_dataset(individuals: Dict[str, Any], families: Dict[str, Any]) -> pd.DataFrame:
+@st.cache_resource(max_entries=4, show_spinner=False)
+def generate_individual_dataset(contents_hash: str, _individuals: Dict[str, Any], _families: Dict[str, Any]) -> pd.DataFrame:
     """
     Builds a clean dataset of individuals with date formatting and parent lookup.
-    """
-    rows = []
-    
-    # Memoized name lookup for performance
-    _name_cache = {}
-    def get_person_name(ind_id: Optional[str]) -> Optional[str]:
-        if not ind_id or pd.isna(ind_id): return None
-        ind_id_clean = str(ind_id).strip('@')
-        if ind_id_clean in _name_cache: return _name_cache[ind_id_clean]
-        
-        person_data = individuals.get(ind_id_clean, {})
-        name = (person_data.get("NAME", [None])[0] or "").replace("/", "")
-        _name_cache[ind_id_clean] = name
-        return name
 
-    for ind_id, data in individuals.items():
-        famc_id_raw = data.get("FAMC", [None])[0]
-        famc_id = famc_id_raw.strip("@") if famc_id_raw else None
+    Cached alongside parse_gedcom under the same contents_hash; the parsed dicts themselves
+    are not hashed. Every rerun gets the same DataFrame back, so callers must not modify it.
+    """
+    # One list per column; the frame is built straight from these lists below
+    ids, genders, births, deaths, fs_ids = [], [], [], [], []
+    fams_ids, famc_ids, father_ids, mother_ids = [], [], [], []
+    # Every name is resolved once up front; parent names are mapped from it after the loop
+    name_map = {ind_id: (data.get("NAME") or "").replace("/", "") for ind_id, data in _individuals.items()}
+
+    for ind_id, data in _individuals.items():
+        famc_id = data.get("FAMC") or None
         father_id, mother_id = None, None
         if famc_id:
-            family_data = families.get(famc_id, {})
-            raw_father_id = family_data.get("HUSB", [None])[0]
-            raw_mother_id = family_data.get("WIFE", [None])[0]
-            father_id = raw_father_id.strip("@") if raw_father_id else None
-            mother_id = raw_mother_id.strip("@") if raw_mother_id else None
+            family_data = _families.get(famc_id, {})
+            father_id = family_data.get("HUSB") or None
+            mother_id = family_data.get("WIFE") or None
             
-        rows.append({
-            "ID Number": ind_id,
-            "Full Name": get_person_name(ind_id),
-            "Gender": data.get("SEX", [None])[0],
-            "Birth Date": format_gedcom_date(data.get("BIRT_DATE", [None])[0]),
-            "Death Date": format_gedcom_date(data.get("DEAT_DATE", [None])[0]),
-            # --- FSFTID IS NOW ADDED HERE ---
-            "FSFTID": data.get("_FSFTID", [None])[0],
-            "FAMS ID": ", ".join(id.strip("@") for id in data.get("FAMS", []) if id),
-            "FAMC ID": famc_id,
-            "Father's ID Number": father_id,
-            "Father's Full Name": get_person_name(father_id),
-            "Mother's ID Number": mother_id,
-            "Mother's Full Name": get_person_name(mother_id),
-        })
-    return pd.DataFrame(rows)
+        ids.append(ind_id)
+        genders.append(data.get("SEX"))
+        births.append(data.get("BIRT_DATE"))
+        deaths.append(data.get("DEAT_DATE"))
+        fs_ids.append(data.get("_FSFTID", [None])[0])
+        fams_ids.append(", ".join(data.get("FAMS", ())))
+        famc_ids.append(famc_id)
+        father_ids.append(father_id)
+        mother_ids.append(mother_id)
+
+    dataset = pd.DataFrame({
+        "ID Number": ids,
+        "Full Name": list(name_map.values()),
+        "Gender": genders,
+        # Dates are formatted per column, after the loop
+        "Birth Date": format_gedcom_dates(pd.Series(births, dtype=object)),
+        "Death Date": format_gedcom_dates(pd.Series(deaths, dtype=object)),
+        "FSFTID": fs_ids,
+        "FAMS ID": fams_ids,
+        "FAMC ID": famc_ids,
+        "Father's ID Number": father_ids,
+        "Father's Full Name": resolve_names(father_ids, name_map),
+        "Mother's ID Number": mother_ids,
+        "Mother's Full Name": resolve_names(mother_ids, name_map),
+    }).astype(dict.fromkeys(CATEGORICAL_COLUMNS, "category"))
+    return dataset
 
 # ---------------------------------------------------------
-# DESCENDANT FINDER (UNCHANGED)
+# DESCENDANT FINDER
 # ---------------------------------------------------------
 
 def find_all_descendants(
@@ -162,37 +84,65 @@ def find_all_descendants(
     Finds all descendants of a given person up to a maximum number of generations.
     """
     if not start_person_id: return set()
-    descendant_ids = set()
-    queue = [(start_person_id, 1)]
-    processed_ids = set()
+    # People are marked as seen when queued, not when processed, so nobody reached through
+    # several families is queued twice; BFS still reaches everyone at their lowest generation
+    descendant_ids = {start_person_id}
+    queue = deque([(start_person_id, 1)])
+    # Bound-method lookups hoisted out of the traversal
+    get_person, get_family = individuals.get, families.get
     while queue:
-        current_id, generation = queue.pop(0)
-        if current_id in processed_ids: continue
-        
-        processed_ids.add(current_id)
-        descendant_ids.add(current_id)
+        current_id, generation = queue.popleft()
         if generation >= max_generations: continue
         
-        person_data = individuals.get(current_id, {})
+        person_data = get_person(current_id, {})
         fams_ids = person_data.get("FAMS", [])
         for fam_id in fams_ids:
-            fam_id = fam_id.strip('@')
             if not fam_id: continue
             
-            family_data = families.get(fam_id, {})
+            family_data = get_family(fam_id, {})
             children_ids = family_data.get("CHIL", [])
             for child_id in children_ids:
-                child_id_clean = child_id.strip('@')
-                if child_id_clean and child_id_clean not in processed_ids:
-                     descendant_ids.add(child_id_clean)
-                     queue.append((child_id_clean, generation + 1))
+                if child_id and child_id not in descendant_ids:
+                    descendant_ids.add(child_id)
+                    queue.append((child_id, generation + 1))
     
     return descendant_ids
 
 # ---------------------------------------------------------
-# STREAMLIT APP (UNCHANGED)
+# STREAMLIT APP
 # ---------------------------------------------------------
 
+def show_preview(df: pd.DataFrame) -> None:
+    """
+    Shows the first PREVIEW_ROWS rows of a table, noting when more were left out.
+    """
+    st.dataframe(df.head(PREVIEW_ROWS), use_container_width=True)
+    if len(df) > PREVIEW_ROWS:
+        st.caption(f"Showing the first {PREVIEW_ROWS:,} of {len(df):,} rows; download the CSV for all of them.")
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def dataset_csv(contents_hash: str, _dataset: pd.DataFrame) -> bytes:
+    """
+    Encodes the full dataset as CSV for its download button.
+
+    Cached under the same contents_hash as the dataset, so picking another person
+    doesn't re-export every row on each rerun.
+    """
+    return _dataset.to_csv(index=False).encode('utf-8')
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def person_labels(contents_hash: str, _dataset: pd.DataFrame) -> Tuple[List[str], Dict[str, str]]:
+    """
+    Builds the descendant selectbox labels ("Name (ID: I1)") and a label -> ID map, so a
+    selection resolves with one lookup instead of being parsed back out of its label.
+
+    Cached under the dataset's contents_hash; callers must not modify the results.
+    """
+    # Labels built with vectorized string ops
+    named = _dataset.dropna(subset=['Full Name'])
+    name_list = (named['Full Name'] + ' (ID: ' + named['ID Number'] + ')').tolist()
+    return name_list, dict(zip(name_list, named['ID Number']))
+
 def main():
     """Main function to run the Streamlit app."""
     st.title("FamilySearch.com GEDCOM Individual Dataset Generator v2.7")
@@ -203,25 +153,21 @@ def main():
 
     if uploaded_file:
         try:
-            try:
-                contents = uploaded_file.read().decode("utf-8-sig")
-            except UnicodeDecodeError:
-                uploaded_file.seek(0)
-                contents = uploaded_file.read().decode("latin-1")
-            
+            file_bytes = uploaded_file.getvalue()
+            contents_hash = gedcom_digest(file_bytes)
             with st.spinner("Parsing GEDCOM file..."):
-                individuals, families = parse_gedcom(contents)
+                individuals, families = parse_gedcom(contents_hash, file_bytes)
             
             if not individuals:
                 st.warning("No individuals found in the uploaded GEDCOM file.")
                 return
 
             with st.spinner("Generating dataset..."):
-                dataset = generate_individual_dataset(individuals, families)
+                dataset = generate_individual_dataset(contents_hash, individuals, families)
 
             st.subheader("Generated Dataset of All Individuals")
-            st.dataframe(dataset, use_container_width=True)
-            csv_data = dataset.to_csv(index=False).encode('utf-8')
+            show_preview(dataset)
+            csv_data = dataset_csv(contents_hash, dataset)
             st.download_button(
                 label="Download Full Dataset as CSV",
                 data=csv_data,
@@ -233,9 +179,7 @@ def main():
             st.markdown("---")
             st.subheader("Descendant Analysis")
             
-            name_list = dataset.dropna(subset=['Full Name']).apply(
-                lambda row: f"{row['Full Name']} (ID: {row['ID Number']})", axis=1
-            ).tolist()
+            name_list, id_by_label = person_labels(contents_hash, dataset)
             
             if not name_list:
                 st.warning("No individuals with names found for descendant analysis.")
@@ -246,7 +190,7 @@ def main():
                 options=name_list
             )
             if selected_person_str:
-                start_id = re.search(r'\(ID: (.*?)\)', selected_person_str).group(1)
+                start_id = id_by_label[selected_person_str]
                 
                 with st.spinner(f"Finding descendants of {start_id}..."):
                     descendant_ids = find_all_descendants(
@@ -257,10 +201,10 @@ def main():
                     )
                 
                 if descendant_ids:
-                    descendant_df = dataset[dataset['ID Number'].isin(descendant_ids)].copy()
+                    descendant_df = dataset[dataset['ID Number'].isin(descendant_ids)]
                     
                     st.write(f"Found **{len(descendant_df)}** descendants for the selected individual.")
-                    st.dataframe(descendant_df, use_container_width=True)
+                    show_preview(descendant_df)
                     csv_desc_data = descendant_df.to_csv(index=False).encode('utf-8')
                     st.download_button(
                         label="Download Descendant Dataset as CSV",
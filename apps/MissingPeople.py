@@ -1,25 +1,189 @@
 import streamlit as st
 import pandas as pd
-from thefuzz import fuzz # For fuzzy string matching
-from typing import Optional, Any
+import numpy as np
+from typing import List
+import os
+import sys
+from rapidfuzz import fuzz, process # For fuzzy string matching
+
+# Pages run as standalone scripts (directly or via main.py), so the shared module is imported
+# from this folder rather than as part of a package
+APPS_DIR = os.path.dirname(os.path.abspath(__file__))
+if APPS_DIR not in sys.path:
+    sys.path.insert(0, APPS_DIR)
+from _gedcom_core import PREVIEW_ROWS, gedcom_digest, read_genealogy_csv
 
 # --- Page Configuration ---
 st.set_page_config(layout="wide", page_title="Genealogy Comparator")
 
 # --- Helper Functions ---
 
-def get_year(date_str: Any) -> Optional[int]:
-    """Safely extracts the year from a date string."""
-    if pd.isna(date_str) or not isinstance(date_str, str):
-        return None
-    try:
-        # Extract the first 4-digit number as the year
-        year_match = pd.to_datetime(date_str, errors='coerce')
-        if pd.notna(year_match):
-            return year_match.year
-    except Exception:
-        return None
-    return None
+def get_years(dates: pd.Series) -> pd.Series:
+    """Extracts the year from a whole column of date strings in one vectorized pass."""
+    if not (pd.api.types.is_object_dtype(dates) or pd.api.types.is_string_dtype(dates)):
+        return pd.Series(np.nan, index=dates.index)
+    return pd.to_datetime(dates, errors='coerce', format='mixed').dt.year
+
+# Lowest name threshold the slider offers; the cached score tensors keep every pair reaching it.
+# About 0.03% of random name pairs score 70 or more, against 2.3% at 50: a 79k x 79k comparison
+# keeps ~2 million pairs (~30 MB) instead of ~145 million (over 2 GB)
+MIN_NAME_THRESHOLD = 70
+
+# thefuzz reported scores rounded to whole points, so a score within half a point below a
+# threshold counted as reaching it; score cutoffs sit this much lower to keep those pairs
+ROUNDING_MARGIN = 0.5
+
+# Parents only need to come within this many points of the name threshold
+PARENT_THRESHOLD_OFFSET = 10
+
+# Source rows are scored in chunks so one block's float64 score matrix stays around 16 MB
+MAX_BLOCK_CELLS = 2_000_000
+
+# Columns whose exact agreement makes two rows a match at any slider setting
+MATCH_KEY_COLUMNS = ['clean_name', 'birth_year', 'death_year', 'clean_father', 'clean_mother']
+
+# Stand-in for a missing year in the compact int16 year arrays
+MISSING_YEAR = np.iinfo(np.int16).min
+
+def year_array(years: pd.Series) -> np.ndarray:
+    """Packs a (float, NaN-for-missing) year column into int16 with MISSING_YEAR for gaps."""
+    return years.fillna(MISSING_YEAR).to_numpy(dtype=np.int16)
+
+def year_gaps(source_years: np.ndarray, target_years: np.ndarray) -> np.ndarray:
+    """Element-wise absolute year difference; a missing year on either side counts as no gap."""
+    gaps = np.abs(source_years.astype(np.int32) - target_years)
+    gaps[(source_years == MISSING_YEAR) | (target_years == MISSING_YEAR)] = 0
+    return gaps.astype(np.int16)
+
+def surname_initials(names: pd.Series) -> pd.Series:
+    """Blocking key for candidate pairs: the first letter of each (cleaned) surname."""
+    return names.fillna('').str.split().str[-1].str[:1].fillna('')
+
+@st.cache_data
+def prep_for_match(df: pd.DataFrame) -> pd.DataFrame:
+    """Adds the lowercased name columns and birth/death years the matcher works on."""
+    return df.assign(
+        clean_name=df['Full Name'].str.lower().str.strip(),
+        birth_year=get_years(df['Birth Date']),
+        death_year=get_years(df['Death Date']),
+        clean_father=df["Father's Full Name"].str.lower().str.strip(),
+        clean_mother=df["Mother's Full Name"].str.lower().str.strip(),
+    )
+
+def match_keys(df: pd.DataFrame) -> pd.MultiIndex:
+    """Everything the matcher compares, as one hashable key per row (missing text as '')."""
+    return pd.MultiIndex.from_frame(df[MATCH_KEY_COLUMNS].fillna({
+        'clean_name': '', 'clean_father': '', 'clean_mother': '',
+    }))
+
+def score_candidate_pairs(source_df: pd.DataFrame, target_df: pd.DataFrame, block_by_surname: bool = False) -> pd.DataFrame:
+    """
+    Scores every (source, target) pair that could match at any slider setting.
+
+    Sources with an exact twin in the target (same cleaned name, years and parents)
+    match at every setting, so a hash lookup settles them and each is recorded as one
+    perfect pair. The rest have their names scored against every target, or, with
+    block_by_surname, only against targets sharing their surname initial; one RapidFuzz
+    cdist call per block (chunked to bound memory). Pairs whose names round to MIN_NAME_THRESHOLD or more keep their
+    name and parent scores, rounded to whole points as thefuzz reported them, plus their
+    birth/death year gaps.
+    """
+    exact = match_keys(source_df).isin(match_keys(target_df))
+
+    src_names = source_df['clean_name'].fillna('').to_numpy()
+    tgt_names = target_df['clean_name'].fillna('').to_numpy()
+    if block_by_surname:
+        src_blocks = source_df.groupby(surname_initials(source_df['clean_name']), sort=False).indices
+        tgt_blocks = target_df.groupby(surname_initials(target_df['clean_name']), sort=False).indices
+    else:
+        # One block holding everyone
+        src_blocks = {'': np.arange(len(source_df))}
+        tgt_blocks = {'': np.arange(len(target_df))}
+
+    src_parts, tgt_parts = [np.empty(0, dtype=np.intp)], [np.empty(0, dtype=np.intp)]
+    score_parts = [np.empty(0, dtype=np.uint8)]
+    for key, src_rows in src_blocks.items():
+        tgt_rows = tgt_blocks.get(key)
+        src_rows = src_rows[~exact[src_rows]]
+        if tgt_rows is None or len(src_rows) == 0:
+            continue
+        chunk_size = max(1, MAX_BLOCK_CELLS // len(tgt_rows))
+        for start in range(0, len(src_rows), chunk_size):
+            chunk_rows = src_rows[start:start + chunk_size]
+            name_scores = process.cdist(
+                src_names[chunk_rows],
+                tgt_names[tgt_rows],
+                scorer=fuzz.ratio,
+                score_cutoff=MIN_NAME_THRESHOLD - ROUNDING_MARGIN,
+                dtype=np.float64,
+                workers=-1,
+            )
+            i, j = np.nonzero(name_scores)
+            src_parts.append(chunk_rows[i])
+            tgt_parts.append(tgt_rows[j])
+            score_parts.append(np.rint(name_scores[i, j]).astype(np.uint8))
+    src_idx, tgt_idx = np.concatenate(src_parts), np.concatenate(tgt_parts)
+
+    def parent_scores(column: str) -> np.ndarray:
+        scores = process.cpdist(
+            source_df[column].fillna('').to_numpy()[src_idx],
+            target_df[column].fillna('').to_numpy()[tgt_idx],
+            scorer=fuzz.ratio,
+            score_cutoff=MIN_NAME_THRESHOLD - PARENT_THRESHOLD_OFFSET - ROUNDING_MARGIN,
+            dtype=np.float64,
+            workers=-1,
+        )
+        return np.rint(scores).astype(np.uint8)
+
+    exact_rows = np.flatnonzero(exact)
+    perfect_scores = np.full(len(exact_rows), 100, dtype=np.uint8)
+    no_gaps = np.zeros(len(exact_rows), dtype=np.int16)
+    return pd.DataFrame({
+        'source_row': np.concatenate([src_idx, exact_rows]),
+        'name_score': np.concatenate(score_parts + [perfect_scores]),
+        'birth_gap': np.concatenate([
+            year_gaps(year_array(source_df['birth_year'])[src_idx], year_array(target_df['birth_year'])[tgt_idx]),
+            no_gaps,
+        ]),
+        'death_gap': np.concatenate([
+            year_gaps(year_array(source_df['death_year'])[src_idx], year_array(target_df['death_year'])[tgt_idx]),
+            no_gaps,
+        ]),
+        'father_score': np.concatenate([parent_scores('clean_father'), perfect_scores]),
+        'mother_score': np.concatenate([parent_scores('clean_mother'), perfect_scores]),
+    })
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def build_score_tensors(
+    contents_hash: str, block_by_surname: bool, _source_df: pd.DataFrame, _target_dfs: List[pd.DataFrame]
+) -> List[pd.DataFrame]:
+    """
+    Scores the source against each target once; slider changes only re-mask the cached pairs.
+
+    The frames are excluded from the cache key; contents_hash, a digest of the uploaded files,
+    identifies them instead. Every cache hit hands back the same pair frames without a pickle
+    round-trip, so callers must treat them as read-only.
+    """
+    # One target at a time: every cdist/cpdist call already spreads over all cores (workers=-1),
+    # so scoring targets concurrently would only oversubscribe them
+    return [score_candidate_pairs(_source_df, target_df, block_by_surname) for target_df in _target_dfs]
+
+def find_matched_sources(
+    pairs: pd.DataFrame, source_count: int, name_threshold: int, year_tolerance: int
+) -> np.ndarray:
+    """Returns a boolean array flagging the source rows with a scored pair that passes the settings."""
+    # We can be more lenient with parents
+    parent_threshold = name_threshold - PARENT_THRESHOLD_OFFSET
+    ok = (
+        (pairs['name_score'].to_numpy() >= name_threshold)
+        & (pairs['birth_gap'].to_numpy() <= year_tolerance)
+        & (pairs['death_gap'].to_numpy() <= year_tolerance)
+        & (pairs['father_score'].to_numpy() >= parent_threshold)
+        & (pairs['mother_score'].to_numpy() >= parent_threshold)
+    )
+    matched = np.zeros(source_count, dtype=bool)
+    matched[pairs['source_row'].to_numpy()[ok]] = True
+    return matched
 
 # --- Main Application UI ---
 st.title("🔬 Genealogy CSV Comparator")
@@ -33,7 +197,7 @@ st.sidebar.header("⚙️ Matching Settings")
 
 name_threshold = st.sidebar.slider(
     "Name Similarity Threshold (%)",
-    min_value=50,
+    min_value=MIN_NAME_THRESHOLD,
     max_value=100,
     value=85,
     help="How similar do names need to be to be considered a match? 100 is an exact match."
@@ -47,6 +211,12 @@ year_tolerance = st.sidebar.slider(
     help="How many years of difference are allowed for birth/death dates?"
 )
 
+block_by_surname = st.sidebar.checkbox(
+    "Only compare people whose surnames share a first letter",
+    value=False,
+    help="Much faster on large trees, but misses matches recorded under a different surname (e.g. married names)."
+)
+
 st.sidebar.write("---")
 
 # --- File Uploaders ---
@@ -61,85 +231,56 @@ with col1:
     )
 
 with col2:
-    st.subheader("Target File")
-    target_file = st.file_uploader(
-        "Upload the CSV to check against (e.g., FamilySearch)",
+    st.subheader("Target Files")
+    target_files = st.file_uploader(
+        "Upload one or more CSVs to check against (e.g., FamilySearch)",
         type="csv",
-        key="target"
+        key="target",
+        accept_multiple_files=True
     )
 
 
 # --- Main Comparison Logic ---
-if st.button("🚀 Run Comparison", use_container_width=True) and source_file and target_file:
+# Identifies the current uploads; a new or re-uploaded file gets a new file_id
+uploaded_ids = (source_file.file_id, tuple(f.file_id for f in target_files)) if source_file and target_files else None
+
+if st.button("🚀 Run Comparison", use_container_width=True) and uploaded_ids:
+    st.session_state.compared_files = uploaded_ids
+
+# Once run, the comparison stays live for the same files: moving a slider only re-masks the
+# cached score tensors, while swapping an upload waits for another click
+if uploaded_ids and st.session_state.get('compared_files') == uploaded_ids:
     with st.spinner("Loading and preparing data..."):
         # Load data into pandas DataFrames
-        source_df = pd.read_csv(source_file)
-        target_df = pd.read_csv(target_file)
-
-        # Pre-process data for faster comparison
-        # Convert names to lowercase and extract years
-        source_df['clean_name'] = source_df['Full Name'].str.lower().str.strip()
-        source_df['birth_year'] = source_df['Birth Date'].apply(get_year)
-        source_df['death_year'] = source_df['Death Date'].apply(get_year)
-        source_df['clean_father'] = source_df["Father's Full Name"].str.lower().str.strip()
-        source_df['clean_mother'] = source_df["Mother's Full Name"].str.lower().str.strip()
-        
-        target_df['clean_name'] = target_df['Full Name'].str.lower().str.strip()
-        target_df['birth_year'] = target_df['Birth Date'].apply(get_year)
-        target_df['death_year'] = target_df['Death Date'].apply(get_year)
-        target_df['clean_father'] = target_df["Father's Full Name"].str.lower().str.strip()
-        target_df['clean_mother'] = target_df["Mother's Full Name"].str.lower().str.strip()
+        source_df = read_genealogy_csv(source_file)
+        target_dfs = [read_genealogy_csv(target_file) for target_file in target_files]
+
+        # Lowercased names and extracted years, reused across threshold changes
+        source_df = prep_for_match(source_df)
+        target_dfs = [prep_for_match(target_df) for target_df in target_dfs]
         
     with st.spinner("Comparing records... This might take a moment."):
-        missing_people_rows = []
-        total_source_rows = len(source_df)
-
-        # Loop through each person in the source file
-        for index, source_person in source_df.iterrows():
-            found_match = False
-            
-            # Now, search for a match in the entire target file
-            for _, target_person in target_df.iterrows():
-                
-                # 1. Check Name Similarity
-                name_similarity = fuzz.ratio(source_person['clean_name'], target_person['clean_name'])
-                if name_similarity < name_threshold:
-                    continue # Not a match, try next person
-
-                # 2. Check Birth Year Tolerance
-                if source_person['birth_year'] and target_person['birth_year']:
-                    if abs(source_person['birth_year'] - target_person['birth_year']) > year_tolerance:
-                        continue # Birth years are too far apart
-
-                # 3. Check Death Year Tolerance
-                if source_person['death_year'] and target_person['death_year']:
-                    if abs(source_person['death_year'] - target_person['death_year']) > year_tolerance:
-                        continue # Death years are too far apart
-                
-                # 4. Check Parent Name Similarity
-                father_similarity = fuzz.ratio(str(source_person['clean_father']), str(target_person['clean_father']))
-                mother_similarity = fuzz.ratio(str(source_person['clean_mother']), str(target_person['clean_mother']))
-                
-                # We can be more lenient with parents
-                if father_similarity < name_threshold - 10 or mother_similarity < name_threshold - 10:
-                    continue
-
-                # If all checks passed, we found a match!
-                found_match = True
-                break # Stop searching for this person and move to the next in the source file
-            
-            # If after checking all target people, no match was found...
-            if not found_match:
-                missing_people_rows.append(source_person)
-
-    st.success(f"Comparison complete! Found **{len(missing_people_rows)}** people in the source file who are likely missing from the target file.")
-
-    if missing_people_rows:
-        # Create a DataFrame from the missing people
-        missing_df = pd.DataFrame(missing_people_rows)
+        contents_hash = ' '.join(gedcom_digest(f.getvalue()) for f in [source_file, *target_files])
+        score_tensors = build_score_tensors(contents_hash, block_by_surname, source_df, target_dfs)
+        matched_per_target = [
+            find_matched_sources(pairs, len(source_df), name_threshold, year_tolerance)
+            for pairs in score_tensors
+        ]
+        # Someone is missing only if no target file has them
+        matched = np.logical_or.reduce(matched_per_target)
+        missing_df = source_df[~matched]
+
+    st.success(f"Comparison complete! Found **{len(missing_df)}** people in the source file who are likely missing from the target file{'s' if len(target_dfs) > 1 else ''}.")
+    if len(target_dfs) > 1:
+        for target_file, target_matched in zip(target_files, matched_per_target):
+            st.write(f"- **{target_file.name}**: {int((~target_matched).sum())} source people not found")
+
+    if not missing_df.empty:
         # Drop the temporary 'clean' columns before displaying
         columns_to_show = [col for col in source_df.columns if not col.startswith('clean_')]
-        st.dataframe(missing_df[columns_to_show], use_container_width=True)
+        st.dataframe(missing_df[columns_to_show].head(PREVIEW_ROWS), use_container_width=True)
+        if len(missing_df) > PREVIEW_ROWS:
+            st.caption(f"Showing the first {PREVIEW_ROWS:,} of {len(missing_df):,} rows; download the CSV for all of them.")
 
         # Allow downloading the results
         csv_data = missing_df[columns_to_show].to_csv(index=False).encode('utf-8')
@@ -0,0 +1,316 @@
+"""GEDCOM parsing, table, CSV and export helpers shared by the pages in this folder."""
+import streamlit as st
+import pandas as pd
+from typing import Dict, Tuple, Any, Optional, List, Iterable, Iterator
+import re
+import sys
+import io
+import hashlib
+
+# Strips a leading date qualifier (ABT, BEF, ...) and reduces "BET x AND y" to x in one pass
+DATE_QUALIFIER_RE = re.compile(
+    r'^(?:(?:ABT|EST|CAL|INT|BEF|AFT|FROM|TO)\s+)?(?:BET\s+(.*?)\s+AND.*)?', re.IGNORECASE
+)
+
+# The shapes nearly all GEDCOM dates take, parsed with fast fixed formats; whatever they miss
+# falls through to pandas' much slower per-value 'mixed' parser
+GEDCOM_DATE_FORMATS = ('%d %b %Y', '%Y', '%b %Y')
+
+# Tags that hold a single value per record; the parser stores these as plain strings
+# (first occurrence wins) instead of one-element lists
+SINGLE_VALUED = frozenset({"NAME", "SEX", "BIRT_DATE", "DEAT_DATE", "HUSB", "WIFE", "FAMC"})
+
+# Level-1 tags whose value is an xref; the parser stores it with the @ delimiters already removed
+POINTER_TAGS = frozenset({"FAMC", "FAMS", "HUSB", "WIFE", "CHIL"})
+
+# Columns of the per-individual table built from parse_individual_tags, in display order;
+# every FAMS link goes in the one FAMS column
+INDIVIDUAL_TABLE_COLUMNS = [
+    'ID', 'NAME', '_FSFTID', 'SEX', 'BIRTDATE', 'BIRTDATEPLAC', 'FAMC', 'DEAT',
+    'DEATDATE', 'DEATDATEPLAC', 'BAPLDATE', 'BAPLDATETEMP', 'CONLDATE', 'CONLDATETEMP',
+    'ENDLDATE', 'ENDLDATETEMP', 'BURIDATE', 'BURIDATEPLAC', 'BURIPLAC', 'FAMS',
+]
+
+# Download formats for a parsed table, as (file extension, MIME type); CSV and Parquet
+# are written many times faster than an Excel workbook
+EXPORT_FORMATS = {
+    'Excel': ('xlsx', 'application/vnd.ms-excel'),
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+# Most rows shipped to the browser per table; downloads, exports and comparisons always use every row
+PREVIEW_ROWS = 1000
+
+# Columns of the individual datasets (generated or uploaded as CSV) with few distinct values,
+# stored as categoricals (one code per cell instead of one string)
+CATEGORICAL_COLUMNS = ["Gender", "Father's Full Name", "Mother's Full Name"]
+
+# Arrow would otherwise turn clean ISO date columns into datetime.date objects
+CSV_DTYPES = {'Birth Date': 'str', 'Death Date': 'str', **dict.fromkeys(CATEGORICAL_COLUMNS, 'category')}
+
+def iter_gedcom_records(lines: Iterable[str]) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+    """Streams GEDCOM lines and yields (record type, ID, tags) for each INDI/FAM record as it closes."""
+    current_id: Optional[str] = None
+    current_type: Optional[str] = None
+    records: Dict[str, Any] = {}
+    # The level-1 line that CONC/CONT and level-2 tags attach to
+    parent_tag: Optional[str] = None
+    parent_index: Optional[int] = None
+    parent_kept = False
+    single_valued = SINGLE_VALUED  # local lookups in the hot loop
+    pointer_tags = POINTER_TAGS
+    # Tags and xrefs repeat on every record; interned, each distinct one is stored once
+    intern = sys.intern
+    
+    for line in lines:
+        # Only the line break, trailing blanks or (rarely) indentation need removing
+        line = line.rstrip()
+        if not line:
+            continue
+        if line[0] in " \t":
+            line = line.lstrip()
+        if current_id is None and line[0] != "0":
+            continue  # inside a record we don't keep (HEAD, SOUR, NOTE, ...): only a new level-0 line matters
+        
+        # One C-level split and an unpack; slicing around str.find/partition measured slower
+        parts = line.split(" ", 2)
+        if len(parts) == 3:
+            level_str, tag, value = parts
+        elif len(parts) == 2:
+            level_str, tag = parts
+            value = ""
+        else:
+            continue  # a bare level number carries no tag
+        if len(level_str) == 1 and "0" <= level_str <= "9":
+            level = ord(level_str) - 48  # single-digit level, by far the common case
+        else:
+            try:
+                level = int(level_str)
+            except ValueError:
+                continue
+        
+        if level == 0:
+            if current_id and current_type:
+                yield current_type, current_id, records
+            
+            if value == "INDI" or value == "FAM":
+                current_id = intern(tag.strip("@"))
+                current_type = value
+                records = {}
+                parent_tag = None
+            else:
+                current_id = None
+                current_type = None
+        
+        if not current_id:
+            continue
+        
+        if level == 1:
+            tag = intern(tag)
+            if tag in pointer_tags:
+                value = intern(value.strip("@"))
+                if not value and tag not in single_valued:
+                    # An empty FAMS/CHIL points nowhere; leaving it out lets callers join the lists as-is
+                    parent_tag = None
+                    continue
+            if tag in single_valued:
+                # Only the first occurrence is kept, as a plain string
+                parent_kept = tag not in records
+                if parent_kept:
+                    records[tag] = value
+                parent_index = None
+            else:
+                values = records.get(tag)
+                if values is None:
+                    values = records[tag] = []
+                values.append(value)
+                parent_index = len(values) - 1
+            parent_tag = tag
+        elif level > 1 and parent_tag is not None:
+            if tag == "CONC" or tag == "CONT":
+                piece = value if tag == "CONC" else "\n" + value
+                if parent_index is not None:
+                    records[parent_tag][parent_index] += piece
+                elif parent_kept:
+                    records[parent_tag] += piece
+            else:
+                full_tag = intern(parent_tag + "_" + tag)
+                if full_tag in single_valued:
+                    records.setdefault(full_tag, value)
+                else:
+                    values = records.get(full_tag)
+                    if values is None:
+                        values = records[full_tag] = []
+                    values.append(value)
+
+    if current_id and current_type:
+        yield current_type, current_id, records
+
+def gedcom_digest(file_bytes: bytes) -> str:
+    """Names a GEDCOM by its contents; the cache key for everything parsed or built from it."""
+    return hashlib.blake2b(file_bytes, digest_size=16).hexdigest()
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def parse_gedcom(contents_hash: str, _file_bytes: bytes) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Parses raw GEDCOM bytes and extracts individuals and families, decoding line by line.
+
+    Cached as a resource, so every rerun gets the same dict objects back without a pickle
+    round-trip. Callers must treat the returned dicts as read-only. The cache is keyed on
+    contents_hash (see gedcom_digest), so Streamlit never hashes the raw bytes itself and
+    every page that is handed the same file shares one parse.
+    """
+    for encoding in ("utf-8-sig", "latin-1"):
+        individuals: Dict[str, Any] = {}
+        families: Dict[str, Any] = {}
+        lines = io.TextIOWrapper(io.BytesIO(_file_bytes), encoding=encoding)
+        try:
+            for record_type, record_id, records in iter_gedcom_records(lines):
+                if record_type == "INDI":
+                    individuals[record_id] = records
+                else:
+                    families[record_id] = records
+        except UnicodeDecodeError:
+            continue
+        return individuals, families
+    return {}, {}
+
+def resolve_names(ids: List[Optional[str]], name_map: Dict[str, str]) -> pd.Series:
+    """Maps individual IDs to display names; unknown IDs give "" and missing IDs give None."""
+    id_series = pd.Series(ids, dtype=object)
+    return id_series.map(name_map).fillna("").where(id_series.fillna("") != "", None)
+
+def format_gedcom_dates(dates: pd.Series) -> pd.Series:
+    """Formats a column of GEDCOM dates as YYYY-MM-DD, trying the fixed GEDCOM formats first."""
+    clean_dates = dates.str.strip().str.replace(DATE_QUALIFIER_RE, r'\1', regex=True)
+    formatted = pd.Series(index=dates.index, dtype='str')
+    pending = clean_dates.notna().to_numpy().copy()
+    for date_format in GEDCOM_DATE_FORMATS + ('mixed',):
+        if not pending.any():
+            break
+        parsed = pd.to_datetime(clean_dates[pending], errors='coerce', format=date_format)
+        if date_format != 'mixed':
+            # The mixed parser reads years like 0023 as 2023; leave those to it
+            parsed = parsed.where(parsed.dt.year >= 100)
+        formatted[pending] = parsed.dt.strftime('%Y-%m-%d')
+        pending &= formatted.isna().to_numpy()
+    return formatted
+
+def parse_individual_tags(file_bytes: bytes) -> Dict[str, Dict[str, List[bytes]]]:
+    """Parses INDI records into {ID: {tag: [raw values]}}, level-2 tags joined onto their parent (BIRT + DATE -> BIRTDATE)."""
+    individuals: Dict[str, Dict[str, List[bytes]]] = {}
+    current_individual = None
+    current_individual_data: Dict[str, List[bytes]] = {}
+    current_tag = None
+    # The same few tags repeat on every record; interned, each is stored once and
+    # dict lookups on it compare pointers
+    intern = sys.intern
+
+    # The file is parsed as bytes, so it is never decoded whole: IDs and tags are ASCII and
+    # decoded as they are read, values stay bytes until they land in the DataFrame.
+    # Iterating a BytesIO yields one line at a time rather than a list of every line;
+    # splitlines() is only needed for files whose lines end in a bare CR
+    lines = io.BytesIO(file_bytes) if b'\n' in file_bytes else file_bytes.splitlines()
+    for line in lines:
+        line = line.strip()
+        # Dispatch on the level character once; partition keeps the value as one string,
+        # so there is no split-and-rejoin of its words
+        level = line[:1]
+        if level == b'0':
+            if line.startswith(b'0 @I'):
+                if current_individual is not None:
+                    individuals[current_individual] = current_individual_data
+                    current_individual_data = {}
+                current_individual = line[3:].partition(b'@')[0].decode()
+        elif level == b'1':
+            current_tag, _, value = line.partition(b' ')[2].partition(b' ')
+            current_tag = intern(current_tag.decode())
+            current_individual_data.setdefault(current_tag, []).append(value)
+        elif level == b'2':
+            add_tag, _, value = line.partition(b' ')[2].partition(b' ')
+            full_tag = intern(current_tag + add_tag.decode())
+            current_individual_data.setdefault(full_tag, []).append(value)
+
+    if current_individual is not None:
+        individuals[current_individual] = current_individual_data
+
+    return individuals
+
+def trailing_year(dates: pd.Series) -> pd.Series:
+    """Reads the year off the end of each GEDCOM date ("15 JAN 1823") as nullable Int16."""
+    # The last four characters are parsed as a number, with no regex over every row. Only tails
+    # of exactly four ASCII digits are kept, as the old r'(\d{4})$' did: "196", "850" or "1e3"
+    # would parse too. Nullable Int16 holds a year in 2 bytes instead of float64's 8
+    tail = dates.str.slice(-4)
+    is_year = tail.str.len().eq(4) & tail.str.isascii() & tail.str.isdigit()
+    return pd.to_numeric(tail.where(is_year), errors='coerce').astype('Int16')
+
+def build_individual_table(individuals: Dict[str, Dict[str, List[bytes]]]) -> pd.DataFrame:
+    """Builds the INDIVIDUAL_TABLE_COLUMNS table from parse_individual_tags, plus birth/death years, AGE and CHILDREN."""
+    kept_tags = set(INDIVIDUAL_TABLE_COLUMNS)
+
+    # One list per column, filled in place (None where a person lacks the tag), so no
+    # per-person dict is built. Only kept tags get a column, and only their values are
+    # decoded; the reindex below puts the columns in order
+    column_values: Dict[str, List[Any]] = {'ID': list(individuals)}
+    for row, individual in enumerate(individuals.values()):
+        for tag, values in individual.items():
+            if tag == 'FAMS':
+                # Kept as a tuple until CHILDREN is counted, then joined for display
+                value = tuple(fam.decode('utf-8', 'replace') for fam in values)
+            elif tag in kept_tags:
+                value = b' '.join(values).decode('utf-8', 'replace')
+            else:
+                continue
+            if tag not in column_values:
+                column_values[tag] = [None] * len(individuals)
+            column_values[tag][row] = value
+
+    individual_df = pd.DataFrame(column_values)
+
+    individual_df = individual_df.reindex(columns=INDIVIDUAL_TABLE_COLUMNS)
+
+    # Extract birth and death years
+    individual_df.insert(3, 'BIRTHYEAR', trailing_year(individual_df['BIRTDATE']))
+    individual_df.insert(10, 'DEATHYEAR', trailing_year(individual_df['DEATDATE']))
+
+    # Compute AGE (missing wherever either year is)
+    individual_df['AGE'] = individual_df['DEATHYEAR'] - individual_df['BIRTHYEAR']
+
+    # Count CHILDREN using FAMC appearances: one lookup over every person's families at once
+    famc_counts = individual_df['FAMC'].value_counts()
+    children = individual_df['FAMS'].explode().map(famc_counts).fillna(0).astype('int64')
+    individual_df['CHILDREN'] = children.groupby(level=0).sum()
+    # na_action skips people without families; when nobody has any, FAMS is an all-NaN float
+    # column that has no .str accessor
+    individual_df['FAMS'] = individual_df['FAMS'].map(', '.join, na_action='ignore')
+    return individual_df
+
+def read_genealogy_csv(uploaded_file) -> pd.DataFrame:
+    """
+    Reads an uploaded CSV with pandas' multithreaded Arrow parser, falling back to the C parser
+    for files Arrow rejects (ragged rows, odd quoting). Dates stay strings, as the C parser reads them.
+    """
+    try:
+        df = pd.read_csv(uploaded_file, engine='pyarrow', dtype=CSV_DTYPES)
+    except ValueError:
+        uploaded_file.seek(0)
+        return pd.read_csv(uploaded_file)
+    # Name blank headers (e.g. an exported index) the way the C parser does
+    df.columns = [column or f"Unnamed: {i}" for i, column in enumerate(df.columns)]
+    return df
+
+@st.cache_data
+def convert_df(df: pd.DataFrame, export_format: str) -> io.BytesIO:
+    """Writes a table out in one of the EXPORT_FORMATS, for st.download_button."""
+    export_buffer = io.BytesIO()
+    if export_format == 'Excel':
+        # xlsxwriter builds the workbook faster than the default openpyxl engine
+        df.to_excel(export_buffer, index=False, engine='xlsxwriter')
+    elif export_format == 'CSV':
+        df.to_csv(export_buffer, index=False)
+    else:
+        df.to_parquet(export_buffer, index=False)
+    export_buffer.seek(0)
+    return export_buffer
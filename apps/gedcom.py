@@ -1,34 +1,55 @@
+import os
+import sys
 import pandas as pd
 import streamlit as st
 from io import BytesIO
 from st_aggrid import AgGrid, GridOptionsBuilder
 
+# Pages run as standalone scripts (directly or via main.py), so the shared module is imported
+# from this folder rather than as part of a package
+APPS_DIR = os.path.dirname(os.path.abspath(__file__))
+if APPS_DIR not in sys.path:
+    sys.path.insert(0, APPS_DIR)
+from _gedcom_core import EXPORT_FORMATS, convert_df
+
 # Set the page layout to wide
 st.set_page_config(layout="wide", page_title=f"Gedcoms")
 
-def parse_gedcom(file_contents):
+# AgGrid serializes every row to JSON for its JS grid; bigger tables go to st.dataframe (Arrow) instead
+AGGRID_MAX_ROWS = 2000
+
+def parse_gedcom(file_bytes):
     individuals = {}
     current_individual = None
     current_individual_data = {}
-
-    for line in file_contents.splitlines():
+    # The same few tags repeat on every record; interned, each is stored once and
+    # dict lookups on it compare pointers
+    intern = sys.intern
+
+    # The file is parsed as bytes, so it is never decoded whole: IDs and tags are ASCII and
+    # decoded as they are read, values stay bytes until they land in the DataFrame.
+    # Iterating a BytesIO yields one line at a time rather than a list of every line;
+    # splitlines() is only needed for files whose lines end in a bare CR
+    lines = BytesIO(file_bytes) if b'\n' in file_bytes else file_bytes.splitlines()
+    for line in lines:
         line = line.strip()
-        if line.startswith('0 @I'):
-            if current_individual is not None:
-                individuals[current_individual] = current_individual_data
-                current_individual_data = {}
-            current_individual = line.split('@')[1]
-        elif line.startswith('1'):
-            current_tag = line.split(' ')[1]
-            value = line.split(' ')[2:]
+        # Dispatch on the level character once; partition keeps the value as one string,
+        # so there is no split-and-rejoin of its words
+        level = line[:1]
+        if level == b'0':
+            if line.startswith(b'0 @I'):
+                if current_individual is not None:
+                    individuals[current_individual] = current_individual_data
+                    current_individual_data = {}
+                current_individual = line[3:].partition(b'@')[0].decode()
+        elif level == b'1':
+            current_tag, _, value = line.partition(b' ')[2].partition(b' ')
+            current_tag = intern(current_tag.decode())
             current_individual_data[current_tag] = value
-        elif line.startswith('2'):
-            add_tag = line.split(' ')[1]
-            current_tag = current_tag + add_tag
-            value = line.split(' ')[2:]
+        elif level == b'2':
+            add_tag, _, value = line.partition(b' ')[2].partition(b' ')
+            current_tag = intern(current_tag + add_tag.decode())
             current_individual_data[current_tag] = value
-        else:
-            continue
 
     if current_individual is not None:
         individuals[current_individual] = current_individual_data
@@ -40,52 +61,49 @@ def main():
     st.sidebar.write("Upload a Gedcom file to parse its contents")
 
     uploaded_file = st.sidebar.file_uploader("Choose a Gedcom file", type="ged")
-
-    if uploaded_file is not None:
-        file_contents = uploaded_file.read().decode('utf-8')
+    export_format = st.sidebar.radio("Export format", list(EXPORT_FORMATS), horizontal=True)
 
     if st.sidebar.button("Submit"):
         if uploaded_file is not None:
-            individuals = parse_gedcom(file_contents)
-            individual_data = []
-            for individual_id, individual in individuals.items():
-                data = {'ID': individual_id}
-                for tag, values in individual.items():
-                    data[tag] = ' '.join(values)
-                individual_data.append(data)
-
-            individual_df = pd.DataFrame(individual_data)
+            individuals = parse_gedcom(uploaded_file.getvalue())
+            # One list per column, filled in place (None where a person lacks the tag), so no
+            # per-person dict is built; columns appear in the order their tags are first seen
+            column_values = {'ID': list(individuals)}
+            for row, individual in enumerate(individuals.values()):
+                for tag, value in individual.items():
+                    if tag not in column_values:
+                        column_values[tag] = [None] * len(individuals)
+                    column_values[tag][row] = value.decode('utf-8', 'replace')
+
+            individual_df = pd.DataFrame(column_values)
             st.write("Parsed Data:")
             #st.dataframe(individual_df, use_container_width=True)
 
             # Store the DataFrame in session state
             st.session_state.individual_df = individual_df
 
-            # Create a GridOptionsBuilder object
-            gb = GridOptionsBuilder.from_dataframe(individual_df)
-            gb.configure_pagination(paginationAutoPageSize=True)  # Enable pagination
-            gb.configure_side_bar()  # Enable a sidebar for filtering
-            gb.configure_default_column(editable=True, groupable=True, sortable=True, filterable=True)
+            if len(individual_df) <= AGGRID_MAX_ROWS:
+                # Create a GridOptionsBuilder object
+                gb = GridOptionsBuilder.from_dataframe(individual_df)
+                gb.configure_pagination(paginationAutoPageSize=True)  # Enable pagination
+                gb.configure_side_bar()  # Enable a sidebar for filtering
+                gb.configure_default_column(editable=True, groupable=True, sortable=True, filterable=True)
 
-            # Build grid options
-            gridOptions = gb.build()
+                # Build grid options
+                gridOptions = gb.build()
 
-            # Display the grid
-            AgGrid(individual_df, gridOptions=gridOptions)
+                # Display the grid
+                AgGrid(individual_df, gridOptions=gridOptions)
+            else:
+                st.dataframe(individual_df, use_container_width=True)
 
+            extension, mime = EXPORT_FORMATS[export_format]
             st.download_button(
-                label="Export to Excel",
-                data=convert_df(individual_df),
-                file_name="individuals.xlsx",
-                mime="application/vnd.ms-excel",
+                label=f"Export to {export_format}",
+                data=convert_df(individual_df, export_format),
+                file_name=f"individuals.{extension}",
+                mime=mime,
             )
 
-@st.cache_data
-def convert_df(df):
-    excel_buffer = BytesIO()
-    df.to_excel(excel_buffer, index=False)
-    excel_buffer.seek(0)
-    return excel_buffer
-
 if __name__ == "__main__":
     main()
\ No newline at end of file